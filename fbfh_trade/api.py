@@ -7,27 +7,164 @@ api_client.py
 """
 
 from __future__ import annotations
-import json
+import random
 import sys
+import threading
 import time
-from typing import Dict, Optional
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
 
 import requests
 import fbfh_trade.logger as log
 
-from fbfh_trade.persistence import save_state, save_json, append_error_log, HITS_PATH, OK_PATH
-from fbfh_trade.http import decode_body
+from fbfh_trade.persistence import save_state, save_json, append_error_log, HITS_PATH, OK_PATH, SAVE_LOCK
+from fbfh_trade.http import decode_body, retry_after_seconds, sleep_unless_stopped
+from fbfh_trade import jsonutil
 
 API_URL = "https://fbfh.trade.gov.tw/fb/common/popGrade.action"
 
 # 固定值（若伺服器更換，會觸發致命錯誤並停止）
 VERIFY_S_HIDDEN = "1DrSTL1zk6l5itRvaE4eGQ=="
 
-# 可選：同目錄若存在 verify_s_hidden_client.py，將在特定錯誤時嘗試刷新
+# 429 退避估算所看的視窗秒數
+CONTROL_WINDOW_SEC = 60.0
+
+# 回應標頭顯示剩餘額度低於上限的此比例時，主動冷卻到額度重置
+RATE_LIMIT_LOW_RATIO = 0.1
+
+# 暫時性伺服器錯誤：與 429 同樣退避後重試同一統編，超過 max_5xx_retries 次才致命停止
+RETRYABLE_5XX = frozenset((500, 502, 503, 504))
+
+# 請求本文 {"banNo":"<8碼>","verifySHidden":"<token>"}：只有 banNo 逐筆變動，
+# 其後的固定片段依 token 快取（token 更新時才重建）
+_BODY_PREFIX = b'{"banNo":"'
+_body_suffix: Tuple[str, bytes] = ("", b"")
+
+
+class _ControlState:
+    """
+    記錄近 window 秒內每次請求是被放行（2xx）或被拒（429、5xx 等），供退避估算擁塞程度；
+    並保存所有執行緒共用的 429 冷卻期限（任一請求遇 429 時，其他請求也等到期限過後才送出），
+    以及可選的全域速率上限（每分鐘請求數，各執行緒依序預約送出時間點）。
+    """
+
+    def __init__(self, window: float) -> None:
+        self.window = window
+        self._events: Deque[Tuple[float, bool]] = deque()
+        self._lock = threading.Lock()
+        self._cooldown_until = 0.0
+        self._min_interval = 0.0
+        self._next_slot = 0.0
+
+    def set_rate(self, rpm: float) -> None:
+        """設定每分鐘請求數上限；0 或負數表示不限制。"""
+        with self._lock:
+            self._min_interval = 60.0 / rpm if rpm > 0 else 0.0
+
+    def record(self, admitted: bool) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._events.append((now, admitted))
+            self._expire(now)
+
+    def counts(self) -> Tuple[int, int]:
+        """回傳視窗內的 (放行數, 被拒數)。"""
+        with self._lock:
+            self._expire(time.monotonic())
+            denied = sum(1 for _, ok in self._events if not ok)
+            return len(self._events) - denied, denied
+
+    def cool_down(self, seconds: float) -> None:
+        """延後所有執行緒的下一次請求至少 seconds 秒。"""
+        with self._lock:
+            self._cooldown_until = max(self._cooldown_until, time.monotonic() + seconds)
+
+    def wait_turn(self, stop: Optional[threading.Event] = None) -> None:
+        """
+        等到可以送出下一個請求：共用冷卻期結束，且距上一個預約時間點至少 60/rpm 秒。
+        時間點在鎖內預約，多個執行緒同時呼叫也會依序錯開。等待中 stop 被設定時拋出 InterruptedError。
+        """
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._cooldown_until, self._next_slot)
+            self._next_slot = start + self._min_interval
+        if start > now:
+            sleep_unless_stopped(start - now, stop)
+
+    def _expire(self, now: float) -> None:
+        cutoff = now - self.window
+        while self._events and self._events[0][0] < cutoff:
+            self._events.popleft()
+
+
+_CONTROL = _ControlState(CONTROL_WINDOW_SEC)
+
+
+class _AimdLimiter:
+    """
+    以 AIMD（加性增、乘性減）調整同時進行中的 POST 數上限，讓並行度追上伺服器實際容量：
+    - 遇 429/5xx：上限減半（不低於 lo）；DECREASE_HOLDOFF_SEC 內只減一次，避免同一波擁塞被重複計算
+    - 每次成功回應：上限加 ALPHA / 上限（約每放行一輪 +ALPHA，不超過 hi）
+    configure 之前不限制。
+    """
+
+    ALPHA = 0.5
+    BETA = 0.5
+    DECREASE_HOLDOFF_SEC = 1.0
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._limit: Optional[float] = None
+        self._lo = 1.0
+        self._hi = 1.0
+        self._inflight = 0
+        self._last_decrease = 0.0
+
+    def configure(self, lo: int, hi: int) -> None:
+        """啟用並行上限控制：上限介於 [lo, hi]，初始為 hi。"""
+        with self._cond:
+            self._hi = float(max(1, hi))
+            self._lo = float(min(max(1, lo), self._hi))
+            self._limit = self._hi
+            self._cond.notify_all()
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self._limit is not None and self._inflight >= int(self._limit):
+                self._cond.wait()
+            self._inflight += 1
+
+    def release(self) -> None:
+        with self._cond:
+            self._inflight -= 1
+            self._cond.notify()
+
+    def on_success(self) -> None:
+        with self._cond:
+            if self._limit is None or self._limit >= self._hi:
+                return
+            before = int(self._limit)
+            self._limit = min(self._hi, self._limit + self.ALPHA / self._limit)
+            if int(self._limit) > before:
+                self._cond.notify_all()
+
+    def on_congestion(self) -> None:
+        with self._cond:
+            now = time.monotonic()
+            if self._limit is None or now - self._last_decrease < self.DECREASE_HOLDOFF_SEC:
+                return
+            self._last_decrease = now
+            self._limit = max(self._lo, self._limit * self.BETA)
+            log.debug(f"API 並行上限降為 {int(self._limit)}")
+
+
+_AIMD = _AimdLimiter()
+
+# 可選：若可載入 token_store（內部使用 verify_s_hidden_client.py），將在特定錯誤時嘗試刷新
 try:
-    from fbfh_trade.company.verify_client import get_verify_s_hidden  # type: ignore
+    from fbfh_trade.company import token_store  # type: ignore
 except Exception:
-    get_verify_s_hidden = None  # type: ignore
+    token_store = None  # type: ignore
 
 
 def fatal_stop_and_log(
@@ -43,15 +180,18 @@ def fatal_stop_and_log(
     """
     寫入 state/hits/ok、記錄 errors.log，輸出錯誤，並結束程式。
     注意：state.json 記錄當前出錯的 ban_no（不 +1），避免下次略過。
+    在工作執行緒中呼叫時，sys.exit 只結束該執行緒，SystemExit 會由 future.result() 交回主執行緒；
+    寫檔期間持有 SAVE_LOCK，避免與主執行緒更新 hits/ok 同時進行。
     """
     try:
         next_number = int(ban_no)
     except Exception:
         next_number = int(last_legal) if last_legal is not None else start_int
 
-    save_state(next_number)
-    save_json(HITS_PATH, hits)
-    save_json(OK_PATH, ok_map)
+    with SAVE_LOCK:
+        save_state(next_number)
+        save_json(HITS_PATH, hits)
+        save_json(OK_PATH, ok_map)
 
     details: Dict[str, object] = {"ban_no": ban_no, "reason": reason}
     details.update(extra)
@@ -76,32 +216,75 @@ def fatal_stop_and_log(
         if isinstance(snippet, str):
             log.error("[STOP] Response snippet: " + repr(snippet[:300]))
 
+    # 輸出可能正交由背景執行緒緩衝：結束前先寫出，停機原因不會遺失
+    log.flush()
     sys.exit(1)
 
 
-def _compute_429_wait_seconds(tries: int, cooldown_on_warn: float, ra_hdr: str) -> float:
+def _request_body(ban_no: str, vhs: str) -> bytes:
+    """組出 POST 本文 bytes；ban_no 為 8 碼數字，直接以 ASCII 嵌入。"""
+    global _body_suffix
+    cached_vhs, suffix = _body_suffix
+    if cached_vhs != vhs:
+        suffix = b'","verifySHidden":' + jsonutil.dumps_compact(vhs) + b"}"
+        _body_suffix = (vhs, suffix)
+    return _BODY_PREFIX + ban_no.encode("ascii") + suffix
+
+
+def configure_concurrency(lo: int, hi: int) -> None:
+    """啟用 AIMD 並行上限控制：同時進行中的 POST 數在 [lo, hi] 之間依 429/5xx 與成功回應自動調整。"""
+    _AIMD.configure(lo, hi)
+
+
+def set_rate_limit(rpm: float) -> None:
+    """設定全部 API 請求共用的每分鐘請求數上限（0 表示不限制）。"""
+    _CONTROL.set_rate(rpm)
+
+
+def _note_rate_limit_headers(headers) -> None:
     """
-    計算 429 等待秒數：
-    1) 若 Retry-After 是數字，優先使用（秒）
-    2) 若 Retry-After 是 HTTP 日期，轉換成剩餘秒數
-    3) 否則採用指數退避：base = cooldown_on_warn 或 2.0；wait = base * 2^(tries-1)，上限 300 秒
+    依回應的 X-RateLimit-* 標頭主動節流：剩餘額度用盡或低於上限的 RATE_LIMIT_LOW_RATIO 時，
+    全域冷卻到 X-RateLimit-Reset（秒數或 epoch 秒）或 Retry-After 指定的時間。伺服器未提供標頭時不動作。
     """
-    ra_hdr = (ra_hdr or "").strip()
-    if ra_hdr:
-        try:
-            return max(0.0, float(ra_hdr))
-        except ValueError:
-            try:
-                from email.utils import parsedate_to_datetime
-                dt = parsedate_to_datetime(ra_hdr)
-                if dt is not None:
-                    return max(0.0, dt.timestamp() - time.time())
-            except Exception:
-                pass
+    remaining_hdr = headers.get("X-RateLimit-Remaining")
+    if remaining_hdr is None:
+        return
+    try:
+        remaining = float(remaining_hdr)
+        limit = float(headers.get("X-RateLimit-Limit") or 0)
+    except ValueError:
+        return
+    if remaining > 0 and (limit <= 0 or remaining >= limit * RATE_LIMIT_LOW_RATIO):
+        return
+
+    wait = retry_after_seconds(headers.get("X-RateLimit-Reset"))
+    if wait is not None and wait > 1e9:
+        wait -= time.time()  # epoch 秒
+    if wait is None:
+        wait = retry_after_seconds(headers.get("Retry-After"))
+    if wait is not None and wait > 0:
+        wait = min(wait, 300.0)
+        _CONTROL.cool_down(wait)
+        log.debug(f"API 額度剩餘 {remaining_hdr}，暫停送出 {wait:.1f} 秒")
 
+
+def _compute_429_wait_seconds(tries: int, cooldown_on_warn: float, ra_hdr: str) -> float:
+    """
+    計算 429／5xx 等待秒數（同一統編的指數退避，再依近 CONTROL_WINDOW_SEC 秒的擁塞程度放大）：
+    1) base = cooldown_on_warn 或 2.0；wait = base * 2^(tries-1)
+    2) 視窗內放行（2xx）數 a、被拒數 d，wait 再乘上 (1 + d / max(a, 1))
+    3) 乘上 0.5~1.5 的隨機抖動，避免與其他請求同步重試；上限 300 秒
+    4) 若 Retry-After 是數字或 HTTP 日期，等待時間至少為其剩餘秒數
+    """
+    admitted, denied = _CONTROL.counts()
     base = cooldown_on_warn or 2.0
-    exp_wait = base * (2 ** max(0, tries - 1))
-    return min(exp_wait, 300.0)
+    wait = base * (2 ** max(0, tries - 1)) * (1 + denied / max(admitted, 1)) * random.uniform(0.5, 1.5)
+    wait = min(wait, 300.0)
+
+    ra_sec = retry_after_seconds(ra_hdr)
+    if ra_sec is not None:
+        return max(wait, ra_sec)
+    return wait
 
 
 def post_company_with_429_retry(
@@ -114,20 +297,33 @@ def post_company_with_429_retry(
     ok_map: Dict,
     last_legal: Optional[str],
     start_int: int,
+    max_5xx_retries: int = 3,
+    stop: Optional[threading.Event] = None,
 ) -> Optional[dict]:
     """
-    針對單一統編發送 POST；遇到 429 依策略等待後重試。
-    非 200、解析失敗、schema 不符或 verifySHidden 異常 → 致命停止。
+    針對單一統編發送 POST；遇到 429 依策略等待後重試，500/502/503/504 以相同退避重試至多 max_5xx_retries 次。
+    其他非 200、解析失敗、schema 不符或 verifySHidden 異常 → 致命停止。
+    session 應由 fbfh_trade.http.create_session 建立（連線池＋不在 adapter 內重試 429）。
+    可由多個執行緒同時呼叫：429 冷卻期、set_rate_limit 的速率上限與 configure_concurrency 的並行上限皆為全域共用。
+    stop 被設定後不再送出新請求，退避等待也立刻中止：拋出 InterruptedError（不落盤、不視為致命錯誤）。
     """
     global VERIFY_S_HIDDEN
     did_refresh_vhs = False
     tries = 0
+    tries_5xx = 0
 
     while True:
+        if stop is not None and stop.is_set():
+            raise InterruptedError("stop requested")
+        _AIMD.acquire()
         try:
+            _CONTROL.wait_turn(stop)
+            # 記下本次送出的值：其他執行緒可能在回應返回前已刷新 VERIFY_S_HIDDEN
+            vhs_sent = VERIFY_S_HIDDEN
+            # 自行編碼請求本文以 data= 送出（Content-Type 已在 session.headers），略過 requests 的 json= 編碼
             resp = session.post(
                 API_URL,
-                json={"banNo": ban_no, "verifySHidden": VERIFY_S_HIDDEN},
+                data=_request_body(ban_no, vhs_sent),
                 timeout=timeout,
             )
         except requests.RequestException as exc:
@@ -141,14 +337,19 @@ def post_company_with_429_retry(
                 last_legal=last_legal,
                 start_int=start_int,
             )
+        finally:
+            _AIMD.release()
 
         # 429：退避後重試同一統編
         if resp.status_code == 429:
             tries += 1
+            _CONTROL.record(admitted=False)
+            _AIMD.on_congestion()
             ra_hdr = resp.headers.get("Retry-After", "")
             wait_sec = _compute_429_wait_seconds(tries=tries, cooldown_on_warn=cooldown_on_warn, ra_hdr=ra_hdr)
-            log.warn(f"{ban_no} HTTP 429, 等 {wait_sec} 秒後重試（第 {tries} 次）")
-            time.sleep(wait_sec)
+            _CONTROL.cool_down(wait_sec)
+            log.warn(f"{ban_no} HTTP 429, 等 {wait_sec:.1f} 秒後重試（第 {tries} 次）")
+            sleep_unless_stopped(wait_sec, stop)
 
             if max_429_retries >= 0 and tries >= max_429_retries:
                 fatal_stop_and_log(
@@ -163,7 +364,21 @@ def post_company_with_429_retry(
                 )
             continue
 
-        # 非 200（且非 429）：直接致命停止
+        _CONTROL.record(admitted=200 <= resp.status_code < 300)
+        _note_rate_limit_headers(resp.headers)
+
+        # 5xx：退避後重試同一統編（503 等回應的 Retry-After 同樣遵守），次數用盡才致命停止
+        if resp.status_code in RETRYABLE_5XX and tries_5xx < max_5xx_retries:
+            tries_5xx += 1
+            _AIMD.on_congestion()
+            ra_hdr = resp.headers.get("Retry-After", "")
+            wait_sec = _compute_429_wait_seconds(tries=tries_5xx, cooldown_on_warn=cooldown_on_warn, ra_hdr=ra_hdr)
+            _CONTROL.cool_down(wait_sec)
+            log.warn(f"{ban_no} HTTP {resp.status_code}, 等 {wait_sec:.1f} 秒後重試（第 {tries_5xx} 次）")
+            sleep_unless_stopped(wait_sec, stop)
+            continue
+
+        # 非 200（且非 429、5xx 重試已用盡）：直接致命停止
         if resp.status_code != 200:
             fatal_stop_and_log(
                 ban_no,
@@ -175,15 +390,16 @@ def post_company_with_429_retry(
                 last_legal=last_legal,
                 start_int=start_int,
             )
+        _AIMD.on_success()
 
-        # 嘗試解析 JSON
+        # 嘗試解析 JSON（API 固定回 UTF-8，直接解析 bytes，略過 requests 的編碼偵測）
         try:
-            data = resp.json()
+            data = jsonutil.loads(resp.content)
         except ValueError:
             decoded = decode_body(resp)
             if decoded:
                 try:
-                    data = json.loads(decoded)
+                    data = jsonutil.loads(decoded)
                 except ValueError:
                     fatal_stop_and_log(
                         ban_no,
@@ -224,13 +440,14 @@ def post_company_with_429_retry(
             errmsg = str(data.get("errmsg") or data.get("error") or data.get("message") or "")
             if (not did_refresh_vhs) and (
                 "請透過網頁執行查詢" in errmsg or "please query data by web site" in errmsg
-            ) and (get_verify_s_hidden is not None):
+            ) and (token_store is not None):
                 try:
-                    new_vhs = get_verify_s_hidden(session=session, timeout=int(timeout))  # type: ignore
+                    token_store.invalidate(vhs_sent)  # type: ignore[union-attr]
+                    new_vhs = token_store.get_token(session=session, timeout=int(timeout))  # type: ignore[union-attr]
                 except Exception:
                     pass
                 else:
-                    if isinstance(new_vhs, str) and new_vhs and new_vhs != VERIFY_S_HIDDEN:
+                    if isinstance(new_vhs, str) and new_vhs and new_vhs != vhs_sent:
                         VERIFY_S_HIDDEN = new_vhs
                         log.info(f"自動更新 VERIFY_S_HIDDEN -> {new_vhs}；重試同一統編 {ban_no}")
                         did_refresh_vhs = True
@@ -250,7 +467,7 @@ def post_company_with_429_retry(
         # 檢查 verifySHidden 一致性（若回傳提供）
         vm = data.get("viewmodel") or {}
         vhs = vm.get("verifySHidden")
-        if vhs is not None and str(vhs) != VERIFY_S_HIDDEN:
+        if vhs is not None and str(vhs) != vhs_sent:
             fatal_stop_and_log(
                 ban_no,
                 reason="verifySHidden mismatch (可能已失效或被更換)",
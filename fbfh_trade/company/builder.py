@@ -8,13 +8,19 @@ company_details_builder.py
 重點：
 1) 執行前比對 hits.json 與既有 company_details.json：
    - 以 hits.json 為準，找出 company_details.json 缺少的 (banNo, year) 才補抓。
-   - 以統編 key 排序逐一比對，就算數量一致也會檢查是否有公司漏掉。
-   - 不會重建整檔；補齊後立即落盤（避免中途失敗丟進度）。
-2) 打 API 若遇 429 Too Many Requests，不略過該筆，採「等待後重試」直到非 429（指數退避＋抖動，最大 60 秒）。
-3) verifySHidden 由 verify_s_hidden_client.py 取得。
+   - 依 hits.json 的順序逐一比對，就算數量一致也會檢查是否有公司漏掉。
+   - 不會每筆重建整檔：補齊的資料逐筆追加到 JSONL 檢查點（<輸出檔名>.jsonl），結束時一次合併寫回；
+     中途失敗時檢查點保留，下次啟動會先併入既有輸出再比對。
+2) 打 API 若遇 429 Too Many Requests，不略過該筆，採「等待後重試」直到非 429（指數退避＋抖動，最大 60 秒，並遵守 Retry-After）。
+3) verifySHidden 由 verify_s_hidden_client.py 取得，經 token_store 快取（TTL 內重用，被擋時才刷新）。
 4) 優先以 JSON body + 最小標頭（模仿 curl）送出；若被擋或非 JSON，刷新 verifySHidden 後再以相同策略重試一次；
    仍失敗時退回 x-www-form-urlencoded + 最小標頭作最後嘗試。
 5) 依指定 Key → 索引對應重構 retrieveDataList，並把評級年度、進出口評級英文代碼一併寫入輸出 JSON。
+6) 以有上限的執行緒池並行補抓（預設 concurrency=4，硬上限 MAX_CONCURRENCY），網路等待彼此重疊；
+   同一統編的多個年度只 POST 一次（API 回傳公司層級資料）。
+   同時請求越多越容易觸發 429；任一執行緒遇 429 時全部暫停同一段退避時間，持續 429 時實際並行度自動降下來。
+   待補清單按 batch_size 分批派送，寫檔由主執行緒每批處理一次。
+7) 所有 POST 共用同一個連線池 Session（keep-alive），但該 Session 拒收 Cookie，維持「不帶 Cookie」的請求特徵。
 
 依賴：
 - fbfh_trade.logger
@@ -24,25 +30,47 @@ company_details_builder.py
     build_and_save(
         input_path: str = "hits.json",
         output_path: str = "company_details.json",
-        timeout: int = 10
+        timeout: int = 10,
+        concurrency: int = 4,
+        batch_size: int = 8
     ) -> dict
+    append_one(details, ban_no, year, meta, output_path="company_details.json", timeout=10, stop=None) -> bool
+    save_output(details, output_path="company_details.json") -> None
 """
 
 from __future__ import annotations
 
-import json
+import os
 import random
+import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.cookiejar import DefaultCookiePolicy
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 
 import requests
+from requests.adapters import HTTPAdapter
 import fbfh_trade.logger as log
-from fbfh_trade.company import verify_client as vsc
+from fbfh_trade import jsonutil
+from fbfh_trade.http import retry_after_seconds, sleep_unless_stopped
+from fbfh_trade.company import token_store
 
 
 API_ENDPOINT = "https://fbfh.trade.gov.tw/fb/common/popBasic.action"
 
+# 最小標頭（模仿 curl；不帶 Referer/Origin/X-Requested-With）。requests 不會修改傳入的 headers，可共用。
+_JSON_HEADERS: Dict[str, str] = {
+    "User-Agent": "curl/8.4.0",
+    "Accept": "application/json",
+    "Content-Type": "application/json",
+}
+_FORM_HEADERS: Dict[str, str] = {
+    "User-Agent": "curl/8.4.0",
+    "Accept": "application/json, text/javascript, */*; q=0.01",
+    "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
+}
+
 # === 欄位對應（依你的 Key 順序 → API retrieveDataList 的索引） ===
 #  0  統一編號
 #  1  公司中文名
@@ -85,6 +113,21 @@ FIELD_MAPPING: List[Tuple[str, int]] = [
     ("export_qualification", 20),        # 19. 出口資格
 ]
 
+# 預先拆成平行 tuple，_map_retrieve_row 每列不必再解包 FIELD_MAPPING
+_FIELD_KEYS: Tuple[str, ...] = tuple(key for key, _ in FIELD_MAPPING)
+_FIELD_INDEXES: Tuple[int, ...] = tuple(idx for _, idx in FIELD_MAPPING)
+
+# 並行上限：同時請求數增加只會讓 API 更快回 429，預設保持低值
+DEFAULT_CONCURRENCY = 4
+MAX_CONCURRENCY = 8
+
+# 429 共用冷卻：任一執行緒遇 429 即延後所有執行緒的下一次請求
+_cooldown_lock = threading.Lock()
+_cooldown_until = 0.0
+
+# append_one 共用的 POST Session（首次呼叫時建立，之後各筆重用 keep-alive 連線）
+_incremental_session: Optional[requests.Session] = None
+
 
 # ========= 公開主流程 =========
 
@@ -92,9 +135,14 @@ def build_and_save(
     input_path: str = "hits.json",
     output_path: str = "company_details.json",
     timeout: int = 10,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    batch_size: int = 8,
 ) -> Dict[str, Dict[str, Any]]:
     """
-    讀 hits.json，找出 company_details.json 缺少的 (banNo, year) 逐筆補抓並寫回。
+    讀 hits.json，找出 company_details.json 缺少的 (banNo, year) 並行補抓並寫回。
+    concurrency 為同時進行中的請求上限（夾在 1 ~ MAX_CONCURRENCY）；
+    調高不會更快，只會更容易觸發 API 的 429 限流。
+    batch_size 為每批派送的筆數，每批完成後寫檔一次。
     回傳合併後的整體 dict。
     """
     log.info("開始處理 hits 檔案…")
@@ -103,8 +151,14 @@ def build_and_save(
     # 載入既有輸出（若不存在則為 {}）
     existing = _load_existing_output(output_path)
 
+    # 併入上次中斷留下的檢查點，合併後立即寫回並清掉檢查點
+    checkpoint = Path(output_path).with_suffix(".jsonl")
+    if _replay_checkpoint(existing, checkpoint):
+        _save_json(existing, output_path)
+        checkpoint.unlink()
+
     # 比對差異：只針對 hits.json 有、existing 沒有的 (banNo, year) 做補抓
-    # 同時做 key 排序、數量與缺漏檢查的 log。
+    # 同時做數量與缺漏檢查的 log。
     missing_pairs = _diff_hits_vs_existing(hits, existing)
 
     if not missing_pairs:
@@ -112,50 +166,110 @@ def build_and_save(
         return existing
 
     # 取得一次 verifySHidden（以獨立 Session 取得；POST 端另走無 Cookie 路徑）
+    concurrency = min(max(1, concurrency), MAX_CONCURRENCY)
     token = _get_verify_token(timeout)
+    session = _create_api_session(pool_size=concurrency)
+
+    # 分批派送：每批最多 batch_size 筆同時送進執行緒池，主執行緒依原排序收結果，
+    # 逐筆追加到檢查點，全部完成後才重寫一次輸出檔（維持輸出順序；build_and_export 依最後一筆續跑）
+    # API 回傳的是公司層級資料，各年度相同：同一統編只 POST 一次，其餘年度共用結果
+    batch_size = max(1, batch_size)
+    row_cache: Dict[str, "Future[Optional[List[Any]]]"] = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as pool, checkpoint.open("ab") as ckpt:
+        for start in range(0, len(missing_pairs), batch_size):
+            batch = missing_pairs[start:start + batch_size]
+            for ban_no, _ in batch:
+                if ban_no not in row_cache:
+                    row_cache[ban_no] = pool.submit(
+                        _fetch_company_row_with_retry,
+                        session=session,
+                        ban_no=ban_no,
+                        token=token,
+                        timeout=timeout,
+                    )
+
+            filled = 0
+            for ban_no, year in batch:
+                row = row_cache[ban_no].result()
+                if row is None:
+                    log.warn(f"查無 retrieveDataList，略過補抓：{ban_no}-{year}")
+                    # 即使這筆失敗也不中斷其他筆
+                    continue
+
+                meta = hits.get(ban_no, {}).get(year, {})  # 安全取
+                enriched = _enrich_row(row, year, meta)
+
+                existing.setdefault(ban_no, {})
+                existing[ban_no][year] = enriched
+                ckpt.write(jsonutil.dumps_compact(
+                    {"ban": ban_no, "year": year, "payload": enriched}) + b"\n")
+                ckpt.flush()
+                filled += 1
+                log.success("已補齊：%s-%s", ban_no, year)
+
+            if filled:
+                log.info(f"已寫入檢查點 {checkpoint}（本批 {filled} 筆）")
+
+    # 全部完成：一次寫回完整輸出並移除檢查點
+    _save_json(existing, output_path)
+    checkpoint.unlink()
+    log.success(f"處理完成，輸出保持於：{output_path}")
+    return existing
 
-    # 逐筆補抓，完成一筆就即時寫檔，避免長流程中途失敗丟進度
-    for ban_no, year in missing_pairs:
-        meta = hits.get(ban_no, {}).get(year, {})  # 安全取
-        import_code = _safe_get_str(meta, "import_total")
-        export_code = _safe_get_str(meta, "export_total")
 
-        row = _fetch_company_row_with_retry(
-            ban_no=ban_no,
-            token=token,
-            timeout=timeout,
-            on_token_refresh=lambda: _get_verify_token(timeout),
-        )
-        if row is None:
-            log.warn(f"查無 retrieveDataList，略過補抓：{ban_no}-{year}")
-            # 即使這筆失敗也不中斷其他筆
-            continue
-
-        details = _map_retrieve_row(row)
-        enriched = {
-            "rating_year": year,
-            "import_total_code": import_code,
-            "export_total_code": export_code,
-            "details": details,
-        }
-
-        existing.setdefault(ban_no, {})
-        existing[ban_no][year] = enriched
-
-        # 逐筆即時落盤
-        _save_json(existing, output_path)
-        log.success(f"已補齊：{ban_no}-{year}（並寫回 {output_path}）")
+def append_one(
+    details: Dict[str, Dict[str, Any]],
+    ban_no: str,
+    year: str,
+    meta: Dict[str, Any],
+    output_path: str = "company_details.json",
+    timeout: int = 10,
+    stop: Optional[threading.Event] = None,
+) -> bool:
+    """
+    增量補抓單一 (banNo, year)：併入呼叫端常駐的 details，並追加到 <output_path>.jsonl 檢查點。
+    不讀 hits.json、不做全量比對、不重寫整檔（整檔寫回由 save_output 或下次 build_and_save 合併檢查點）。
+    meta 為 hits.json 中該筆的內容（import_total / export_total）。
+    已存在回 True；查無 retrieveDataList 回 False。
+    stop 被設定時不再送出請求、429 等待立刻中止，並拋出 InterruptedError。
+    """
+    global _incremental_session
+    if year in details.get(ban_no, {}):
+        return True
+    if _incremental_session is None:
+        _incremental_session = _create_api_session(pool_size=1)
+
+    row = _fetch_company_row_with_retry(
+        session=_incremental_session,
+        ban_no=ban_no,
+        token=_get_verify_token(timeout),
+        timeout=timeout,
+        stop=stop,
+    )
+    if row is None:
+        log.warn(f"查無 retrieveDataList，略過補抓：{ban_no}-{year}")
+        return False
 
-    log.success(f"處理完成，輸出保持於：{output_path}")
-    return existing
+    enriched = _enrich_row(row, year, meta)
+    details.setdefault(ban_no, {})[year] = enriched
+    with Path(output_path).with_suffix(".jsonl").open("ab") as ckpt:
+        ckpt.write(jsonutil.dumps_compact(
+            {"ban": ban_no, "year": year, "payload": enriched}) + b"\n")
+    log.success("已補齊：%s-%s", ban_no, year)
+    return True
+
+
+def save_output(details: Dict[str, Dict[str, Any]], output_path: str = "company_details.json") -> None:
+    """將常駐的 details 整檔寫回 output_path，並移除 append_one 留下的檢查點。"""
+    _save_json(details, output_path)
+    Path(output_path).with_suffix(".jsonl").unlink(missing_ok=True)
 
 
 # ========= 私有輔助：輸入/輸出與比對 =========
 
 def _load_hits_strict(path: str) -> Dict[str, Any]:
     """只讀 hits.json（不支援 hit.json）。"""
-    with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    data = jsonutil.load_path(path)
     log.info(f"已讀取：{path}")
     return data
 
@@ -167,8 +281,7 @@ def _load_existing_output(path: str) -> Dict[str, Any]:
         log.info(f"{path} 不存在，將從空檔開始補齊。")
         return {}
     try:
-        with p.open("r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = jsonutil.load_path(p)
         if not isinstance(data, dict):
             log.warn(f"{path} 結構非 dict，忽略並從空檔開始。")
             return {}
@@ -179,20 +292,39 @@ def _load_existing_output(path: str) -> Dict[str, Any]:
         return {}
 
 
+def _replay_checkpoint(existing: Dict[str, Any], path: Path) -> int:
+    """
+    將 JSONL 檢查點（每行 {"ban", "year", "payload"}）併入 existing，回傳併入筆數。
+    檢查點不存在時回 0；中斷時寫到一半的行會略過。
+    """
+    if not path.exists():
+        return 0
+    merged = 0
+    with path.open("rb") as f:
+        for line in f:
+            try:
+                rec = jsonutil.loads(line)
+                existing.setdefault(rec["ban"], {})[rec["year"]] = rec["payload"]
+            except (ValueError, KeyError, TypeError):
+                log.warn(f"檢查點 {path} 有無法解析的行，已略過。")
+                continue
+            merged += 1
+    log.info(f"已從檢查點 {path} 併入 {merged} 筆。")
+    return merged
+
+
 def _diff_hits_vs_existing(
     hits: Dict[str, Any],
     existing: Dict[str, Any],
 ) -> List[Tuple[str, str]]:
     """
     以 hits.json 為準，比對 existing（company_details.json），
-    回傳 existing 缺少的 (banNo, year) 清單（以 banNo 排序，再以 year 排序）。
+    回傳 existing 缺少的 (banNo, year) 清單（依 hits.json 原有順序，與 build_and_export 續跑時的切片順序一致）。
     並輸出比對資訊到 log（總數、缺漏公司、缺漏年度）。
     """
-    # 以 banNo key 排序
-    hits_bans = sorted(
-        [k for k in hits.keys() if isinstance(hits.get(k), dict)])
-    existing_bans = sorted(
-        [k for k in existing.keys() if isinstance(existing.get(k), dict)])
+    # 保留 hits.json 順序（不排序）；existing 以 set 供 O(1) 查找
+    hits_bans = [k for k, v in hits.items() if isinstance(v, dict)]
+    existing_bans = {k for k, v in existing.items() if isinstance(v, dict)}
 
     # 數量對比
     log.info(
@@ -206,47 +338,74 @@ def _diff_hits_vs_existing(
 
     # 逐統編比對年度
     missing_pairs: List[Tuple[str, str]] = []
+    missing_by_ban: Dict[str, List[str]] = {}
     for ban in hits_bans:
-        hit_years = sorted([y for y in hits.get(
-            ban, {}).keys() if isinstance(hits[ban].get(y), dict)])
-        existed_years = sorted(list((existing.get(ban) or {}).keys()))
-        # 缺少的年度
-        diff_years = [y for y in hit_years if y not in existed_years]
+        years = hits[ban]
+        existed_years = existing[ban] if ban in existing_bans else {}
+        diff_years = [
+            y for y, v in years.items() if isinstance(v, dict) and y not in existed_years]
         if diff_years:
-            for y in diff_years:
-                missing_pairs.append((ban, y))
-            # log 範例
-            log.warn(f"公司 {ban} 缺少年度 {diff_years}")
+            missing_pairs.extend((ban, y) for y in diff_years)
+            missing_by_ban[ban] = diff_years
+
+    # 缺漏年度彙整成一行摘要；逐公司明細只在 DEBUG 開啟時才逐筆輸出
+    if missing_by_ban:
+        examples = dict(list(missing_by_ban.items())[:5])
+        log.warn(f"{len(missing_by_ban)} 家公司缺少年度（示例前 5 筆）：{examples}")
+        if log.PRINT_DEBUG:
+            for ban, years in missing_by_ban.items():
+                log.debug("公司 %s 缺少年度 %s", ban, years)
 
     if not missing_pairs:
         log.success("逐公司年度比對無缺漏。")
     else:
         log.info(f"總缺漏筆數（banNo, year）= {len(missing_pairs)}")
 
-    # 以 banNo, year 排序輸出待補清單
-    missing_pairs.sort(key=lambda x: (x[0], x[1]))
     return missing_pairs
 
 
 def _save_json(data: Dict[str, Any], path: str) -> None:
-    """輸出 JSON（UTF-8、縮排）。"""
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    """
+    輸出 JSON（UTF-8、縮排）；直接寫入已編碼的 bytes，不經文字層重新編碼。
+    先寫暫存檔再取代，程序在寫入途中結束也不會留下半個輸出檔。
+    """
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(jsonutil.dumps(data))
+    os.replace(tmp, path)
 
 
 # ========= 私有輔助：verifySHidden 與請求發送 =========
 
 def _get_verify_token(timeout: int) -> str:
     """
-    以獨立 Session 取得 verifySHidden。
-    使用 GET 抓 HTML，再解析 hidden 欄位。
+    取得 verifySHidden：優先使用 token_store 的快取（TTL 內不重抓），
+    過期或被判定失效時才以獨立 Session GET 抓 HTML 並解析 hidden 欄位。
     """
-    log.info("取得 verifySHidden（獨立 Session）…")
-    session = requests.Session()
-    token = vsc.get_verify_s_hidden(
-        session=session, save_to="", timeout=timeout)
-    log.success("verifySHidden 取得成功。")
-    return token
+    return token_store.get_token(timeout=timeout)
+
+
+def _create_api_session(pool_size: int) -> requests.Session:
+    """
+    建立 POST 專用的共用 Session：
+    - 連線池大小對齊並行數，TCP/TLS 連線可在各筆之間重用（keep-alive）。
+    - 不在 adapter 層重試（429 由 _request_with_backoff 處理）。
+    - Cookie policy 拒收所有 Cookie，效果等同每次都用全新 Session，且可安全跨執行緒共用。
+    """
+    sess = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+    sess.mount("https://", adapter)
+    sess.mount("http://", adapter)
+    sess.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    return sess
+
+
+def _wait_for_cooldown(stop: Optional[threading.Event] = None) -> None:
+    """若其他執行緒剛遇到 429，等到共用冷卻期結束再送出請求（stop 被設定時拋出 InterruptedError）。"""
+    with _cooldown_lock:
+        remaining = _cooldown_until - time.monotonic()
+    if remaining > 0:
+        sleep_unless_stopped(remaining, stop)
 
 
 def _request_with_backoff(
@@ -256,46 +415,62 @@ def _request_with_backoff(
     *,
     max_sleep: float = 60.0,
     base_sleep: float = 1.0,
+    stop: Optional[threading.Event] = None,
     **kwargs: Any,
 ) -> requests.Response:
     """
     發送 HTTP 請求；若遇 429 Too Many Requests，會「等待後重試」，直到非 429。
-    - 退避：指數退避（1s, 2s, 4s, ...），上限 max_sleep（預設 60s），附加 0~0.5 秒隨機抖動。
+    - 退避：指數退避（1s, 2s, 4s, ...），上限 max_sleep（預設 60s），附加 0~0.5 秒隨機抖動；
+      若回應帶 Retry-After，等待時間至少為其指定秒數。
     - 只針對 429 堅持重試；其他狀況交由上層邏輯判斷。
+    - 冷卻期為全部執行緒共用：遇 429 時其他執行緒的下一次請求也會等到冷卻結束。
+    - stop 被設定後不再送出請求，等待中也立刻結束：拋出 InterruptedError。
     """
+    global _cooldown_until
     sleep_sec = base_sleep
     while True:
+        if stop is not None and stop.is_set():
+            raise InterruptedError("stop requested")
+        _wait_for_cooldown(stop)
         resp = sess.request(method=method, url=url, **kwargs)
         if resp.status_code != 429:
             return resp
         # 429：等待後重試
         jitter = random.uniform(0, 0.5)
         wait_for = min(sleep_sec, max_sleep) + jitter
+        ra_sec = retry_after_seconds(resp.headers.get("Retry-After"))
+        if ra_sec is not None:
+            wait_for = max(wait_for, ra_sec)
+        with _cooldown_lock:
+            _cooldown_until = max(_cooldown_until, time.monotonic() + wait_for)
         log.warn(f"HTTP 429 Too Many Requests，{wait_for:.1f}s 後重試…")
-        time.sleep(wait_for)
+        sleep_unless_stopped(wait_for, stop)
         # 指數增長，封頂
         sleep_sec = min(sleep_sec * 2, max_sleep)
 
 
 def _fetch_company_row_with_retry(
+    session: requests.Session,
     ban_no: str,
     token: str,
     timeout: int,
-    on_token_refresh,
+    stop: Optional[threading.Event] = None,
 ) -> Optional[List[Any]]:
     """
     呼叫 API 的重試策略：
-    1) JSON body + 最小標頭（模仿 curl），全新 Session（不攜帶 Cookie）。
+    1) JSON body + 最小標頭（模仿 curl），共用 Session（不攜帶 Cookie）。
+       成功即直接回傳（常見情況），不進入後續重試階梯。
        - 若非 JSON 或結構異常，判斷是否需要刷新 token，再以相同策略再試一次。
     2) 仍失敗則退回 x-www-form-urlencoded + 最小標頭做最後嘗試。
     * 任何步驟中若遇 429，_request_with_backoff 會自動等待並重試，該 payload 不會略過。
     """
-    # 第一次嘗試：JSON + minimal headers（fresh session）
+    # 快速路徑：JSON + minimal headers（cookie-less session）
     row, need_refresh, _ = _fetch_company_row_json_minimal(
-        session=None,
+        session=session,
         ban_no=ban_no,
         token=token,
         timeout=timeout,
+        stop=stop,
     )
     if row is not None:
         return row
@@ -303,13 +478,15 @@ def _fetch_company_row_with_retry(
     # 第二次：刷新 token 後再試一次 JSON
     if need_refresh:
         log.warn(f"{ban_no} JSON 最小標頭被擋，刷新 verifySHidden 後重試 JSON。")
-        time.sleep(0.6)
-        new_token = on_token_refresh()
+        sleep_unless_stopped(0.6, stop)
+        token_store.invalidate(token)
+        token = _get_verify_token(timeout)
         row2, _, _ = _fetch_company_row_json_minimal(
-            session=None,
+            session=session,
             ban_no=ban_no,
-            token=new_token,
+            token=token,
             timeout=timeout,
+            stop=stop,
         )
         if row2 is not None:
             return row2
@@ -317,45 +494,42 @@ def _fetch_company_row_with_retry(
     # 第三次：退回 form-urlencoded + minimal headers
     log.warn(f"{ban_no} 退回 x-www-form-urlencoded 最終嘗試。")
     row3, _, _ = _fetch_company_row_form_minimal(
-        session=None,
+        session=session,
         ban_no=ban_no,
         token=token,
         timeout=timeout,
+        stop=stop,
     )
     return row3
 
 
 def _fetch_company_row_json_minimal(
-    session: Optional[requests.Session],
+    session: requests.Session,
     ban_no: str,
     token: str,
     timeout: int,
+    stop: Optional[threading.Event] = None,
 ) -> Tuple[Optional[List[Any]], bool, Optional[int]]:
     """
     模仿成功的 curl：
       - Content-Type: application/json
       - Accept: application/json
       - 不帶 Referer/Origin/X-Requested-With
-      - 使用 *新的* Session，避免攜帶 Cookie 觸發 WAF
+      - 使用拒收 Cookie 的共用 Session，避免攜帶 Cookie 觸發 WAF
     回傳 (row|None, need_refresh, http_status)
     * 若收到 429，_request_with_backoff 會等待後自動重試，直到非 429。
     """
-    sess = session or requests.Session()
-    headers = {
-        "User-Agent": "curl/8.4.0",
-        "Accept": "application/json",
-        "Content-Type": "application/json",
-    }
     data = {"banNo": ban_no, "verifySHidden": token}
 
     try:
         resp = _request_with_backoff(
-            sess,
+            session,
             "POST",
             API_ENDPOINT,
-            headers=headers,
+            headers=_JSON_HEADERS,
             json=data,
             timeout=timeout,
+            stop=stop,
         )
     except requests.RequestException as exc:
         log.error(f"HTTP 連線失敗（{ban_no} / JSON）：{exc!r}")
@@ -369,7 +543,7 @@ def _fetch_company_row_json_minimal(
         return None, True, status
 
     try:
-        payload = resp.json()
+        payload = jsonutil.loads(resp.content)
     except Exception as exc:
         _log_non_json(resp, ban_no, note=f"JSON 模式：JSON 解析失敗：{exc!r}")
         return None, True, status
@@ -387,32 +561,28 @@ def _fetch_company_row_json_minimal(
 
 
 def _fetch_company_row_form_minimal(
-    session: Optional[requests.Session],
+    session: requests.Session,
     ban_no: str,
     token: str,
     timeout: int,
+    stop: Optional[threading.Event] = None,
 ) -> Tuple[Optional[List[Any]], bool, Optional[int]]:
     """
     最終退回方案：以表單送出，但仍採最小標頭（不帶 Referer/Origin/X-Requested-With）。
     有些站點其中一種會通過。
     * 若收到 429，_request_with_backoff 會等待後自動重試，直到非 429。
     """
-    sess = session or requests.Session()
-    headers = {
-        "User-Agent": "curl/8.4.0",
-        "Accept": "application/json, text/javascript, */*; q=0.01",
-        "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
-    }
     data = {"banNo": ban_no, "verifySHidden": token}
 
     try:
         resp = _request_with_backoff(
-            sess,
+            session,
             "POST",
             API_ENDPOINT,
-            headers=headers,
+            headers=_FORM_HEADERS,
             data=data,
             timeout=timeout,
+            stop=stop,
         )
     except requests.RequestException as exc:
         log.error(f"HTTP 連線失敗（{ban_no} / FORM）：{exc!r}")
@@ -426,7 +596,7 @@ def _fetch_company_row_form_minimal(
         return None, True, status
 
     try:
-        payload = resp.json()
+        payload = jsonutil.loads(resp.content)
     except Exception as exc:
         _log_non_json(resp, ban_no, note=f"FORM 模式：JSON 解析失敗：{exc!r}")
         return None, True, status
@@ -456,21 +626,20 @@ def _log_non_json(resp: requests.Response, ban_no: str, note: str) -> None:
 
 
 def _map_retrieve_row(row: List[Any]) -> Dict[str, Any]:
-    """依 FIELD_MAPPING 對應 retrieveDataList 的欄位，回傳結構化 dict。"""
-    mapped: Dict[str, Any] = {}
-    for key, idx in FIELD_MAPPING:
-        mapped[key] = _safe_pick(row, idx)
-    return mapped
-
-
-def _safe_pick(row: List[Any], idx: int) -> Optional[Any]:
-    """安全取值（避免越界），空字串視為 None。"""
-    if idx < 0 or idx >= len(row):
-        return None
-    value = row[idx]
-    if value in ("", None):
-        return None
-    return value
+    """依 FIELD_MAPPING 對應 retrieveDataList 的欄位（越界或空字串視為 None），回傳結構化 dict。"""
+    n = len(row)
+    values = [row[i] if i < n else None for i in _FIELD_INDEXES]
+    return {key: (None if value == "" else value) for key, value in zip(_FIELD_KEYS, values)}
+
+
+def _enrich_row(row: List[Any], year: str, meta: Dict[str, Any]) -> Dict[str, Any]:
+    """組出輸出 JSON 中單一 (banNo, year) 的內容：評級年度、進出口評級與公司明細。"""
+    return {
+        "rating_year": year,
+        "import_total_code": _safe_get_str(meta, "import_total"),
+        "export_total_code": _safe_get_str(meta, "export_total"),
+        "details": _map_retrieve_row(row),
+    }
 
 
 def _safe_get_str(d: Dict[str, Any], key: str) -> Optional[str]:
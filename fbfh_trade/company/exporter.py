@@ -4,11 +4,13 @@
 from __future__ import annotations
 
 import json
+import os
 import re
 import sys
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
 
+from fbfh_trade import jsonutil
 from fbfh_trade.persistence import get_app_dir
 
 try:
@@ -18,7 +20,7 @@ except Exception:  # noqa: BLE001 - 需廣泛兼容舊版 openpyxl
     ILLEGAL_CHARACTERS_RE = None  # type: ignore[assignment]
 
 from openpyxl import Workbook
-from openpyxl.worksheet.worksheet import Worksheet
+from openpyxl.utils import get_column_letter
 
 # ----------------------------
 # 常數與 I/O 路徑
@@ -54,6 +56,18 @@ HEADERS: List[str] = [
 # 欄寬估算上限，避免因超長字串導致視覺與效能問題
 MAX_COL_WIDTH = 60
 
+# 缺少 payload/details 時共用的唯讀空 dict，避免每列配置新的 {}
+_EMPTY_DICT: Dict[str, Any] = {}
+
+# 異常資料的預留列：統一編號以外的欄位皆為空字串（模組載入時建好，之後只複製）
+_BLANK_ROW_TAIL: Tuple[str, ...] = ("",) * (len(HEADERS) - 1)
+
+# Excel 禁用的控制字元：優先使用 openpyxl 的 ILLEGAL_CHARACTERS_RE；
+# 不可用時改用手動 regex [\x00-\x08 \x0B-\x0C \x0E-\x1F]（保留 \t \n \r）
+_ILLEGAL_RE = ILLEGAL_CHARACTERS_RE or re.compile(r"[\x00-\x08\x0B-\x0C\x0E-\x1F]")
+_ILLEGAL_SEARCH = _ILLEGAL_RE.search
+
+
 
 # ----------------------------
 # 工具函式
@@ -61,15 +75,12 @@ MAX_COL_WIDTH = 60
 def _illegal_char_clean(s: str) -> str:
     """移除 Excel 禁用的控制字元。
 
-    優先使用 openpyxl 的 ILLEGAL_CHARACTERS_RE。若不可用，改用手動 regex：
-    [\x00-\x08 \x0B-\x0C \x0E-\x1F]（保留 \t \n \r）
+    規則見 _ILLEGAL_RE；多數字串不含控制字元，先以 search 檢查，沒有命中就原樣回傳，
+    省去 sub 重建字串。
     """
-    if not s:
+    if not s or _ILLEGAL_SEARCH(s) is None:
         return s
-    if ILLEGAL_CHARACTERS_RE is not None:
-        return ILLEGAL_CHARACTERS_RE.sub("", s)  # type: ignore[operator]
-    # 備援：移除除 \t \n \r 以外的 C0 控制字元
-    return re.sub(r"[\x00-\x08\x0B-\x0C\x0E-\x1F]", "", s)
+    return _ILLEGAL_RE.sub("", s)
 
 
 def _sanitize_cell_value(value: Any) -> str:
@@ -93,20 +104,32 @@ def _sanitize_cell_value(value: Any) -> str:
 
 
 def _best_effort_concat(*parts: Optional[str], sep: str = " / ") -> str:
-    """將多個可能為 None/空字串的欄位做 best-effort 串接。"""
-    cleaned = [_sanitize_cell_value(p).strip() for p in parts if p]
-    return sep.join([c for c in cleaned if c])
+    """將多個可能為 None/空字串的欄位做 best-effort 串接。
+
+    常見情況只有 0 或 1 個非空欄位（例如只有一支電話），直接回傳，不走 join。
+    """
+    cleaned: List[str] = []
+    for p in parts:
+        if p:
+            c = _sanitize_cell_value(p).strip()
+            if c:
+                cleaned.append(c)
+    if not cleaned:
+        return ""
+    if len(cleaned) == 1:
+        return cleaned[0]
+    return sep.join(cleaned)
 
 
 def _read_json(path: Path) -> Dict[str, Any]:
     if not path.exists():
         raise FileNotFoundError(f"找不到輸入檔案：{path}")
-    with path.open("r", encoding="utf-8") as f:
-        return json.load(f)
+    # 直接解析檔案內容（orjson 可用時以 mmap 映射，不經文字解碼與 bytes 複製）
+    return jsonutil.load_path(path)
 
 
-def _flatten_records(raw: Dict[str, Any]) -> Iterable[Dict[str, Any]]:
-    """將輸入 JSON 轉為列資料（dict）。
+def _flatten_records(items: Iterable[Tuple[str, Any]]) -> Iterable[List[Any]]:
+    """將輸入 JSON 轉為列資料（依 HEADERS 順序排列的值 list）。
 
     假設結構（依使用者提供片段，不作過度臆測）：
     {
@@ -140,145 +163,129 @@ def _flatten_records(raw: Dict[str, Any]) -> Iterable[Dict[str, Any]]:
 
     注意：若鍵不存在，一律以空字串處理，不中斷。
     """
-    for tax_id, years in raw.items():
+    for tax_id, years in items:
         if not isinstance(years, dict):
             # 防禦性處理：資料異常時仍產出一列以便檢視
-            yield {
-                "統一編號": tax_id,
-                "公司名稱": "",
-                "電話號碼": "",
-                "進口評級": "",
-                "出口評級": "",
-                "評等年度": "",
-                "公司名稱(英文)": "",
-                "代表人": "",
-                "登記地址(中文)": "",
-                "登記地址(英文)": "",
-                "最近異動日期": "",
-                "最初登記日期": "",
-                "前名稱(中文)": "",
-                "前名稱(英文)": "",
-                "網站": "",
-                "Email": "",
-                "進口資格": "",
-                "出口資格": "",
-                "進口項目": "",
-                "出口項目": "",
-            }
+            yield [tax_id, *_BLANK_ROW_TAIL]
             continue
 
         for _, payload in years.items():
-            details = payload.get("details", {}) if isinstance(
-                payload, dict) else {}
-            # 映射各欄位（缺漏即以空字串）
-            row = {
-                "統一編號": tax_id,
-                "公司名稱": details.get("company_name_zh", ""),
-                "電話號碼": _best_effort_concat(
+            if not isinstance(payload, dict):
+                payload = _EMPTY_DICT
+            details = payload.get("details") or _EMPTY_DICT
+            # 依 HEADERS 順序映射各欄位（缺漏即以空字串）
+            yield [
+                tax_id,                                              # 統一編號
+                details.get("company_name_zh", ""),                  # 公司名稱
+                _best_effort_concat(
                     details.get("telephone_1"), details.get("telephone_2")
-                ),
-                "進口評級": payload.get("import_total_code", ""),
-                "出口評級": payload.get("export_total_code", ""),
-                "評等年度": payload.get("rating_year", ""),
-                "公司名稱(英文)": details.get("company_name_en", ""),
-                "代表人": details.get("representative", ""),
-                "登記地址(中文)": details.get("business_address_zh", ""),
-                "登記地址(英文)": details.get("business_address_en", ""),
-                "最近異動日期": details.get("last_modified_date", ""),
-                "最初登記日期": details.get("initial_register_date", ""),
-                "前名稱(中文)": details.get("former_name_zh", ""),
-                "前名稱(英文)": details.get("former_name_en", ""),
-                "網站": details.get("website", ""),
-                "Email": details.get("email", ""),
-                "進口資格": details.get("import_qualification", ""),
-                "出口資格": details.get("export_qualification", ""),
-                "進口項目": details.get("items_for_import", ""),
-                "出口項目": details.get("items_for_export", ""),
-            }
-            yield row
-
-
-def _auto_fit_column_width(ws: Worksheet) -> None:
-    """依儲存格內容粗估欄寬，並設上限。"""
-    for col_cells in ws.columns:
-        max_len = 0
-        column_letter = col_cells[0].column_letter
-        for cell in col_cells:
-            try:
-                text = "" if cell.value is None else str(cell.value)
-            except Exception:
-                text = ""
-            max_len = max(max_len, len(text))
-        ws.column_dimensions[column_letter].width = min(
+                ),                                                   # 電話號碼
+                payload.get("import_total_code", ""),                # 進口評級
+                payload.get("export_total_code", ""),                # 出口評級
+                payload.get("rating_year", ""),                      # 評等年度
+                details.get("company_name_en", ""),                  # 公司名稱(英文)
+                details.get("representative", ""),                   # 代表人
+                details.get("business_address_zh", ""),              # 登記地址(中文)
+                details.get("business_address_en", ""),              # 登記地址(英文)
+                details.get("last_modified_date", ""),               # 最近異動日期
+                details.get("initial_register_date", ""),            # 最初登記日期
+                details.get("former_name_zh", ""),                   # 前名稱(中文)
+                details.get("former_name_en", ""),                   # 前名稱(英文)
+                details.get("website", ""),                          # 網站
+                details.get("email", ""),                            # Email
+                details.get("import_qualification", ""),             # 進口資格
+                details.get("export_qualification", ""),             # 出口資格
+                details.get("items_for_import", ""),                 # 進口項目
+                details.get("items_for_export", ""),                 # 出口項目
+            ]
+
+
+def _set_column_widths(ws: Any, max_lens: List[int]) -> None:
+    """依各欄最長字串長度設定欄寬（+2 緩衝，下限 10，上限 MAX_COL_WIDTH）。"""
+    for col_idx, max_len in enumerate(max_lens, start=1):
+        ws.column_dimensions[get_column_letter(col_idx)].width = min(
             MAX_COL_WIDTH, max(10, max_len + 2))
 
 
-def write_excel(rows: Iterable[Dict[str, Any]], path: Path) -> Tuple[int, int]:
+def write_excel(row_source: Callable[[], Iterable[List[Any]]], path: Path) -> Tuple[int, int]:
     """將列資料寫入 Excel。
 
+    使用 openpyxl 的 write-only 模式，列資料直接串流寫入檔案，不在記憶體中建立整張儲存格表
+    （有安裝 lxml 時 openpyxl 會自動改用較快的 XML 輸出）。write-only 模式下欄寬必須在
+    第一次 append 前設定，因此分兩趟：第一趟清洗並估算欄寬，第二趟重新產生列、清洗後逐列寫出，
+    不保留整份清洗結果。
+
     參數：
-        rows: 由 _flatten_records 產生的 dict 迭代器
+        row_source: 每次呼叫都回傳一個新的列迭代器（由 _flatten_records 產生、依 HEADERS 順序排列的值 list）
         path: 輸出檔案路徑
 
     回傳：
         (total_rows, failed_rows)
     """
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "company_details"
-
-    # 1) 表頭
-    ws.append(HEADERS)
-
-    failed = 0
+    failed_rows: Set[int] = set()
     total = 0
+    max_lens = [len(h) for h in HEADERS]
+    sanitize = _sanitize_cell_value  # 熱迴圈內改用區域變數查找
 
-    for row_idx, row in enumerate(rows, start=2):  # Excel 第 2 列起為資料列
+    # 第一趟：清洗並估算欄寬；清洗失敗的列記下列號，第二趟略過
+    for row_idx, row in enumerate(row_source(), start=2):  # Excel 第 2 列起為資料列
         total += 1
         try:
-            values = [_sanitize_cell_value(row.get(h, "")) for h in HEADERS]
-            ws.append(values)
+            values = tuple(sanitize(v) for v in row)
         except Exception as exc:  # noqa: BLE001 - 實務上需捕獲所有寫入錯誤並標示
-            failed += 1
+            failed_rows.add(row_idx)
             exc_name = exc.__class__.__name__
             print(
                 f"[ERROR] 寫入 Excel 失敗：資料列 {row_idx} 寫入失敗（{exc_name}: {exc}）。"
-                f" 欄位型別：{{h: type(row.get(h, '')).__name__ for h in HEADERS}} ",
+                f" 欄位型別：{[type(v).__name__ for v in row]} ",
                 file=sys.stderr,
             )
+            continue
+        max_lens = list(map(max, max_lens, map(len, values)))
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title="company_details")
 
-    # 2) 凍結窗格：鎖定表頭
+    # 1) 欄寬與凍結窗格（write-only 模式需在寫入第一列前設定）
+    _set_column_widths(ws, max_lens)
     ws.freeze_panes = "A2"
 
-    # 3) 自動篩選
-    ws.auto_filter.ref = ws.dimensions
+    # 2) 表頭與資料列（第二趟：逐列清洗後直接寫出）
+    ws.append(HEADERS)
+    for row_idx, row in enumerate(row_source(), start=2):
+        if row_idx in failed_rows:
+            continue
+        ws.append(tuple(sanitize(v) for v in row))
 
-    # 4) 欄寬估算
-    _auto_fit_column_width(ws)
+    # 3) 自動篩選（範圍已知，直接組字串）
+    written = total - len(failed_rows)
+    ws.auto_filter.ref = f"A1:{get_column_letter(len(HEADERS))}{written + 1}"
 
-    # 5) 輸出
-    wb.save(path)
-    return total, failed
+    # 4) 輸出：先存到暫存檔再取代，中途結束不會留下寫到一半的 Excel
+    tmp = path.with_name(path.name + ".tmp")
+    wb.save(tmp)
+    os.replace(tmp, path)
+    return total, len(failed_rows)
 
 
 def main() -> None:
     try:
-        raw = _read_json(INPUT_JSON)
+        # 先完整解析輸入：格式錯誤在這裡就以代碼 2 結束，不會拖到寫 Excel 時才失敗
+        data = _read_json(INPUT_JSON)
     except Exception as exc:  # noqa: BLE001
         print(f"[ERROR] 讀取輸入 JSON 失敗：{exc}", file=sys.stderr)
         sys.exit(2)
 
-    rows = list(_flatten_records(raw))
-    if not rows:
-        print("[WARN] 輸入 JSON 解析後沒有任何資料列。仍會輸出只有表頭的 Excel。")
-
     try:
-        total, failed = write_excel(rows, OUTPUT_XLSX)
+        total, failed = write_excel(lambda: _flatten_records(data.items()), OUTPUT_XLSX)
     except Exception as exc:  # noqa: BLE001
         exc_name = exc.__class__.__name__
         print(f"[ERROR] 寫入 Excel 失敗（{exc_name}: {exc}）", file=sys.stderr)
         sys.exit(3)
 
+    if total == 0:
+        print("[WARN] 輸入 JSON 解析後沒有任何資料列。已輸出只有表頭的 Excel。")
+
     ok = total - failed
     print(f"[INFO] 完成輸出：{OUTPUT_XLSX}")
     print(f"[INFO] 總列數：{total}，成功：{ok}，失敗：{failed}")
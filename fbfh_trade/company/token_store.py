@@ -0,0 +1,85 @@
+# token_store.py
+# -*- coding: utf-8 -*-
+"""
+Process-wide cache for the 'verifySHidden' token.
+
+- The token is fetched once via verify_client.get_verify_s_hidden and reused
+  for TOKEN_TTL_SEC seconds.
+- Callers that get rejected by the server call invalidate(stale) and then
+  get_token() again; passing the stale value makes concurrent callers share a
+  single refetch instead of each triggering one.
+- The fetch runs outside the lock: one caller fetches while the others wait
+  for its result (single flight), and cached reads never wait on the network.
+
+Public API:
+    get_token(session: Optional[requests.Session] = None, timeout: int = 10) -> str
+    invalidate(stale: Optional[str] = None) -> None
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Dict, Optional
+
+import requests
+
+import fbfh_trade.logger as log
+from fbfh_trade.company import verify_client as vsc
+
+TOKEN_TTL_SEC = 600.0
+
+_token_cache: Dict[str, object] = {"value": None, "exp": 0.0}
+_cond = threading.Condition()
+_fetching = False
+
+
+def get_token(session: Optional[requests.Session] = None, timeout: int = 10) -> str:
+    """
+    Return the cached token, fetching a new one if missing or expired.
+
+    Args:
+        session: Optional session used for the GET (keeps cookies aligned).
+            When omitted, a temporary session is created and closed afterwards.
+        timeout: Requests timeout (seconds).
+    """
+    global _fetching
+    with _cond:
+        while True:
+            value = _token_cache["value"]
+            if isinstance(value, str) and time.time() < float(_token_cache["exp"]):  # type: ignore[arg-type]
+                return value
+            if not _fetching:
+                break
+            # Another caller is fetching; wait for its result (or its failure).
+            _cond.wait()
+        _fetching = True
+
+    token: Optional[str] = None
+    try:
+        log.info("verifySHidden 快取不存在或已過期，重新取得…")
+        if session is None:
+            with requests.Session() as own:
+                token = vsc.get_verify_s_hidden(session=own, save_to="", timeout=timeout)
+        else:
+            token = vsc.get_verify_s_hidden(session=session, save_to="", timeout=timeout)
+    finally:
+        with _cond:
+            if token is not None:
+                _token_cache["value"] = token
+                _token_cache["exp"] = time.time() + TOKEN_TTL_SEC
+            _fetching = False
+            _cond.notify_all()
+    return token
+
+
+def invalidate(stale: Optional[str] = None) -> None:
+    """
+    Expire the cached token so the next get_token() refetches.
+
+    If stale is given, only expire when the cache still holds that value,
+    i.e. another caller has not refreshed it already.
+    """
+    with _cond:
+        if stale is None or _token_cache["value"] == stale:
+            _token_cache["exp"] = 0.0
@@ -23,6 +23,12 @@ from typing import Optional, Dict
 
 import requests
 
+try:
+    from selectolax.parser import HTMLParser  # type: ignore
+    _HAS_SELECTOLAX = True
+except Exception:
+    _HAS_SELECTOLAX = False
+
 try:
     from bs4 import BeautifulSoup  # type: ignore
     _HAS_BS4 = True
@@ -34,6 +40,15 @@ import fbfh_trade.logger as log
 
 API_ENDPOINT = "https://fbfh.trade.gov.tw/fb/web/queryBasicf.do"
 
+# Single-pass fallback pattern, compiled once: an <input> whose id/name is
+# verifySHidden, with the value attribute either after (group 1) or before
+# (group 2) the id/name attribute inside the same tag.
+_VERIFY_S_RE = re.compile(
+    r'<input\b[^>]*?\b(?:id|name)\s*=\s*["\']verifySHidden["\'][^>]*?\bvalue\s*=\s*["\']([^"\']+)["\']'
+    r'|<input\b[^>]*?\bvalue\s*=\s*["\']([^"\']+)["\'][^>]*?\b(?:id|name)\s*=\s*["\']verifySHidden["\']',
+    re.IGNORECASE | re.DOTALL,
+)
+
 
 class VerifySHiddenNotFoundError(RuntimeError):
     """Raised when verifySHidden cannot be located in the HTML response."""
@@ -90,12 +105,34 @@ def get_verify_s_hidden(
     else:
         log.warn("未提供輸出檔案路徑，僅回傳 token。")
 
-    log.success("成功透過 BeautifulSoup/Regex 解析 verifySHidden。")
+    log.success("成功解析 verifySHidden。")
     return token
 
 
 def _extract_verify_s_hidden(html: str) -> str:
-    """Extract verifySHidden using BeautifulSoup if present, else fallback to regex."""
+    """
+    Extract verifySHidden from the page.
+
+    Tries, in order: selectolax (if installed), the precompiled regex, and
+    BeautifulSoup (if installed) as a last resort for markup the regex misses.
+    Neither selectolax nor the regex builds a Python DOM for the whole page.
+    """
+    if _HAS_SELECTOLAX:
+        try:
+            node = HTMLParser(html).css_first('input#verifySHidden, input[name="verifySHidden"]')
+            if node is not None:
+                val = (node.attributes.get("value") or "").strip()
+                if val:
+                    return val
+        except Exception as exc:
+            log.warn(f"selectolax 解析失敗：{exc!r}")
+
+    m = _VERIFY_S_RE.search(html)
+    if m:
+        val = (m.group(1) or m.group(2)).strip()
+        if val:
+            return val
+
     if _HAS_BS4:
         try:
             soup = BeautifulSoup(html, "html.parser")
@@ -109,23 +146,6 @@ def _extract_verify_s_hidden(html: str) -> str:
         except Exception as exc:
             log.warn(f"BeautifulSoup 解析失敗：{exc!r}")
 
-    # Regex fallback
-    input_tag_pattern = re.compile(
-        r'<input\b[^>]*?(?:\b(?:id|name)\s*=\s*["\']verifySHidden["\'])[^>]*?>',
-        re.IGNORECASE | re.DOTALL,
-    )
-    value_attr_pattern = re.compile(
-        r'\bvalue\s*=\s*["\']([^"\']+)["\']',
-        re.IGNORECASE | re.DOTALL,
-    )
-    m = input_tag_pattern.search(html)
-    if m:
-        vm = value_attr_pattern.search(m.group(0))
-        if vm:
-            val = vm.group(1).strip()
-            if val:
-                return val
-
     snippet = html[:500].replace("\n", " ")
     log.error(f"解析 verifySHidden 失敗，前 500 字元片段：{snippet}")
     raise VerifySHiddenNotFoundError("在 HTML 中找不到 verifySHidden。")
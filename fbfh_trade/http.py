@@ -7,23 +7,41 @@ HTTP session 與回應解碼工具。
 """
 
 from __future__ import annotations
+import threading
+import time
 import zlib
+from email.utils import parsedate_to_datetime
 from typing import Optional
 
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+try:
+    # 可選：br 解壓（模組載入時匯入一次，不在每次解碼時嘗試 import）
+    import brotli as _brotli  # type: ignore
+except Exception:
+    try:
+        import brotlicffi as _brotli  # type: ignore
+    except Exception:
+        _brotli = None  # type: ignore
+
 
 def create_session(pool_size: int, retries: int, backoff: float) -> requests.Session:
-    """建立帶重試與連線池設定的 Session。"""
+    """
+    建立帶重試與連線池設定的 Session（api.post_company_with_429_retry 預期使用此 Session）。
+    - 連線池大小 pool_size，連線以 keep-alive 重用。
+    - urllib3 只重試連線/讀取錯誤；任何 HTTP 狀態碼（429 與 5xx）一律交回呼叫端，
+      由 api 的退避邏輯統一處理（共用冷卻期、遵守 Retry-After），不在 adapter 內默默 sleep 重送。
+    """
     session = requests.Session()
 
     retry = Retry(
         total=retries,
         backoff_factor=backoff,
-        status_forcelist=(500, 502, 503, 504),
+        status_forcelist=(),
         allowed_methods=frozenset(["POST"]),
+        respect_retry_after_header=False,
         raise_on_status=False,
     )
     adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_size, pool_maxsize=pool_size)
@@ -46,33 +64,61 @@ def create_session(pool_size: int, retries: int, backoff: float) -> requests.Ses
     return session
 
 
-def try_brotli_decompress(raw: bytes) -> Optional[bytes]:
-    """嘗試以 brotli 或 brotlicffi 解壓縮，失敗則回傳 None。"""
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After（秒數或 HTTP 日期），回傳距今剩餘秒數；缺少或無法解析回傳 None。"""
+    value = (value or "").strip()
+    if not value:
+        return None
     try:
-        import brotli  # type: ignore
-
-        return brotli.decompress(raw)
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        dt = parsedate_to_datetime(value)
     except Exception:
-        try:
-            import brotlicffi  # type: ignore
+        return None
+    if dt is None:
+        return None
+    return dt.timestamp() - time.time()
 
-            return brotlicffi.decompress(raw)  # type: ignore
-        except Exception:
-            return None
+
+def sleep_unless_stopped(seconds: float, stop: Optional[threading.Event]) -> None:
+    """等待 seconds 秒；期間 stop 被設定就立刻拋出 InterruptedError（stop 為 None 時即一般 sleep）。"""
+    if stop is None:
+        time.sleep(seconds)
+    elif stop.wait(seconds):
+        raise InterruptedError("stop requested")
+
+
+def try_brotli_decompress(raw: bytes) -> Optional[bytes]:
+    """嘗試以 brotli 或 brotlicffi 解壓縮，未安裝或失敗則回傳 None。"""
+    if _brotli is None:
+        return None
+    try:
+        return _brotli.decompress(raw)
+    except Exception:
+        return None
 
 
 def decode_body(resp: requests.Response) -> Optional[str]:
-    """依 Content-Encoding 解碼 Response 內容為文字，失敗回傳 None。"""
+    """
+    依 Content-Encoding 解碼 Response 內容為文字，失敗回傳 None。
+    requests/urllib3 取 resp.content 時通常已解開 gzip/deflate；只有內容仍是壓縮格式時才再解一次，
+    否則直接當文字解碼，不做注定失敗的解壓（省一次整份緩衝配置）。
+    """
     encoding = (resp.headers.get("Content-Encoding") or "").lower().strip()
     raw = resp.content
     try:
-        if encoding == "gzip":
+        if encoding == "gzip" and raw[:2] == b"\x1f\x8b":
             return zlib.decompress(raw, zlib.MAX_WBITS | 16).decode(resp.encoding or "utf-8", errors="replace")
         if encoding == "deflate":
             try:
                 return zlib.decompress(raw).decode(resp.encoding or "utf-8", errors="replace")
             except zlib.error:
-                return zlib.decompress(raw, -zlib.MAX_WBITS).decode(resp.encoding or "utf-8", errors="replace")
+                try:
+                    return zlib.decompress(raw, -zlib.MAX_WBITS).decode(resp.encoding or "utf-8", errors="replace")
+                except zlib.error:
+                    pass  # 已由 urllib3 解壓，改當純文字
         if encoding == "br":
             dec = try_brotli_decompress(raw)
             if dec is not None:
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+jsonutil.py
+JSON 編解碼共用入口：可載入 orjson 時使用 orjson，否則退回標準庫 json。
+輸出格式與 json.dumps(obj, ensure_ascii=False, indent=2) 相同（UTF-8 bytes）；
+dumps_compact 則為單行無空白格式，供 JSONL 逐行追加使用。
+"""
+
+from __future__ import annotations
+import json
+import mmap
+import os
+from typing import Any, Union
+
+try:
+    import orjson  # type: ignore
+except Exception:
+    orjson = None  # type: ignore
+
+# 解析失敗時拋出的例外（orjson.JSONDecodeError 亦為其子類別）
+JSONDecodeError = json.JSONDecodeError
+
+
+def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+    """解析 JSON；bytes 輸入會直接交給 orjson，省去先解碼成 str。"""
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data).decode("utf-8")
+    return json.loads(data)
+
+
+def load_path(path: Union[str, "os.PathLike[str]"]) -> Any:
+    """讀取並解析 JSON 檔。
+
+    orjson 可用時以 mmap 唯讀映射檔案直接解析，不先把整個檔案複製成 bytes；
+    否則（或空檔）退回一般讀檔。
+    """
+    with open(path, "rb") as f:
+        if orjson is None or os.fstat(f.fileno()).st_size == 0:
+            return loads(f.read())
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+            return orjson.loads(view)
+
+
+def dumps(obj: Any) -> bytes:
+    """序列化為縮排 2 格、保留非 ASCII 字元的 UTF-8 bytes。"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def dumps_compact(obj: Any) -> bytes:
+    """序列化為單行、無多餘空白、保留非 ASCII 字元的 UTF-8 bytes（不含換行）。"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
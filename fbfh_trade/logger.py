@@ -5,17 +5,28 @@ A lightweight, importable logging utility with level toggles and optional colors
 
 - Toggle by setting 1/0 variables directly in this module:
     PRINT_DEBUG, PRINT_INFO, PRINT_WARN, PRINT_ERROR, PRINT_SUCCESS, USE_COLOR, LOG_TO_FILE
-- Customize LOG_FILE_PATH to enable file logging.
+- Customize LOG_FILE_PATH to enable file logging. The file is opened once and
+  written through a buffer; it is flushed at exit or when flush() is called.
+- Set LOG_BUFFERING = 1 to hand output off to a background flusher: lines are
+  queued and written (console and log file) in one call every LOG_FLUSH_INTERVAL
+  seconds or once LOG_BUFFER_LINES are queued, so callers never block on I/O.
+  Off by default, since buffered lines can show up after plain print()/input();
+  use set_buffering(True) once interactive prompts are done, call flush() at
+  checkpoints, and set_buffering(False) (which flushes) when done.
 - Usage:
     from fbfh_trade import logger as log
     log.PRINT_DEBUG = 1
     log.info("Hello")
+- Messages may be printf-style templates with args, e.g. log.debug("row %s", row);
+  the template is only formatted when that level is enabled.
 """
 
 from __future__ import annotations
+import atexit
 import sys
-import datetime
-from typing import Optional
+import threading
+import time
+from typing import IO, List, Optional, Tuple
 
 # ===== Toggle switches (1 = on, 0 = off) =====
 PRINT_DEBUG = 0
@@ -28,6 +39,10 @@ USE_COLOR = 1
 LOG_TO_FILE = 0
 LOG_FILE_PATH = "app.log"
 
+LOG_BUFFERING = 0
+LOG_BUFFER_LINES = 256
+LOG_FLUSH_INTERVAL = 0.05
+
 
 # ===== Internal color helpers =====
 def _supports_color() -> bool:
@@ -56,8 +71,19 @@ _COLORS = {
 }
 
 
+# Last formatted timestamp, keyed by epoch second. Stored as one tuple so threads
+# always see a matching (second, text) pair without a lock.
+_ts_cache: Tuple[int, str] = (-1, "")
+
+
 def _now_str() -> str:
-    return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    global _ts_cache
+    now = int(time.time())
+    sec, text = _ts_cache
+    if sec != now:
+        text = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now))
+        _ts_cache = (now, text)
+    return text
 
 
 def _format(level: str, message: str) -> str:
@@ -70,44 +96,134 @@ def _format(level: str, message: str) -> str:
     return base
 
 
-def _write_line(line: str) -> None:
-    print(line)
-    if LOG_TO_FILE:
+# ===== Log file handle (opened lazily, reopened if LOG_FILE_PATH changes) =====
+_log_file: Optional[IO[str]] = None
+_log_file_path: Optional[str] = None
+_log_file_lock = threading.Lock()
+
+
+def _get_log_file() -> IO[str]:
+    global _log_file, _log_file_path
+    if _log_file is None or _log_file_path != LOG_FILE_PATH:
+        if _log_file is not None:
+            _log_file.close()
+        _log_file = open(LOG_FILE_PATH, "a", buffering=65536, encoding="utf-8")
+        _log_file_path = LOG_FILE_PATH
+    return _log_file
+
+
+# ===== Output buffer (used only when LOG_BUFFERING is on) =====
+_stdout_buf: List[str] = []
+_stdout_lock = threading.Lock()
+# 序列化實際輸出，確保批次依序寫出；_stdout_lock 只在交換緩衝時短暫持有
+_drain_lock = threading.Lock()
+_flusher: Optional[threading.Thread] = None
+
+
+def _write_file(text: str) -> None:
+    try:
+        with _log_file_lock:
+            # 寫入純文字（無 ANSI 顏色）
+            _get_log_file().write(text.replace(_COLORS.get("RESET", ""), ""))
+    except Exception:
+        # 檔案寫入不得影響主流程；若失敗，靜默略過。
+        pass
+
+
+def _drain_stdout() -> None:
+    global _stdout_buf
+    with _drain_lock:
+        # 鎖內只換出緩衝，寫主控台/檔案時其他執行緒仍可繼續排入新行
+        with _stdout_lock:
+            if not _stdout_buf:
+                return
+            lines, _stdout_buf = _stdout_buf, []
+        text = "\n".join(lines) + "\n"
         try:
-            with open(LOG_FILE_PATH, "a", encoding="utf-8") as f:
-                # 寫入純文字（無 ANSI 顏色）
-                f.write(line.replace(_COLORS.get("RESET", ""), "") + "\n")
+            sys.stdout.write(text)
+            sys.stdout.flush()
         except Exception:
-            # 檔案寫入不得影響主流程；若失敗，靜默略過。
             pass
+        if LOG_TO_FILE:
+            _write_file(text)
+
+
+def _flush_loop() -> None:
+    while True:
+        time.sleep(LOG_FLUSH_INTERVAL)
+        _drain_stdout()
+
+
+def _buffer_stdout(line: str) -> None:
+    global _flusher
+    with _stdout_lock:
+        _stdout_buf.append(line)
+        full = len(_stdout_buf) >= LOG_BUFFER_LINES
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_loop, name="log-flusher", daemon=True)
+            _flusher.start()
+    if full:
+        _drain_stdout()
+
+
+def flush() -> None:
+    """Flush buffered console and file output."""
+    _drain_stdout()
+    with _log_file_lock:
+        if _log_file is not None:
+            try:
+                _log_file.flush()
+            except Exception:
+                pass
+
+
+atexit.register(flush)
+
+
+def set_buffering(enabled: bool) -> None:
+    """Turn background-flushed output on or off; turning it off flushes pending lines."""
+    global LOG_BUFFERING
+    LOG_BUFFERING = 1 if enabled else 0
+    if not enabled:
+        flush()
+
+
+def _write_line(line: str) -> None:
+    if LOG_BUFFERING:
+        # 主控台與檔案都交給背景 flusher 寫出
+        _buffer_stdout(line)
+        return
+    print(line)
+    if LOG_TO_FILE:
+        _write_file(line + "\n")
 
 
-def debug(message: str) -> None:
+def debug(message: str, *args: object) -> None:
     """Print a DEBUG-level log if enabled."""
     if PRINT_DEBUG:
-        _write_line(_format("DEBUG", message))
+        _write_line(_format("DEBUG", message % args if args else message))
 
 
-def info(message: str) -> None:
+def info(message: str, *args: object) -> None:
     """Print an INFO-level log if enabled."""
     if PRINT_INFO:
-        _write_line(_format("INFO", message))
+        _write_line(_format("INFO", message % args if args else message))
 
 
-def warn(message: str) -> None:
+def warn(message: str, *args: object) -> None:
     """Print a WARN-level log if enabled."""
     if PRINT_WARN:
-        _write_line(_format("WARN", message))
+        _write_line(_format("WARN", message % args if args else message))
 
 
-def error(message: str) -> None:
+def error(message: str, *args: object) -> None:
     """Print an ERROR-level log if enabled."""
     if PRINT_ERROR:
-        _write_line(_format("ERROR", message))
+        _write_line(_format("ERROR", message % args if args else message))
 
 
-def success(message: str) -> None:
+def success(message: str, *args: object) -> None:
     """Print a SUCCESS-level log if enabled."""
     if PRINT_SUCCESS:
-        _write_line(_format("SUCCESS", message))
+        _write_line(_format("SUCCESS", message % args if args else message))
 
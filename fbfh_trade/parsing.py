@@ -16,33 +16,41 @@ def pick_year_row(json_obj: dict, target_year: str) -> Optional[List]:
     - 主要比對 index 6（年份欄）或 index 1 前綴。
     """
     items = (json_obj or {}).get("retrieveDataList") or []
+    target = str(target_year)
     for entry in items:
         if not isinstance(entry, list) or len(entry) < 7:
             continue
-        if str(entry[6]).strip() == str(target_year):
+        # API 欄位通常已是字串，只有非字串時才轉型
+        year = entry[6]
+        if (year if type(year) is str else str(year)).strip() == target:
             return entry
-        if str(entry[1]).strip().startswith(str(target_year)):
+        name = entry[1]
+        if (name if type(name) is str else str(name)).strip().startswith(target):
             return entry
     return None
 
 
+# 有效的單一等第字母
+_AK_SET = frozenset("ABCDEFGHIJK")
+
+
 def is_A_to_K(value: Optional[str]) -> bool:
     """是否為 A~K 單一等第字母。"""
     if not value or not isinstance(value, str):
         return False
-    v = value.strip().upper()
-    return len(v) == 1 and "A" <= v <= "K"
+    return value.strip().upper() in _AK_SET
 
 
 def row_is_normal(entry: List) -> bool:
     """基本完整性檢查：前 7 欄非 None，且中文名稱存在。"""
     if not entry or len(entry) < 7:
         return False
-    first_seven = entry[:7]
-    if any(x is None for x in first_seven):
-        return False
-    name_zh = str(entry[2]).strip() if entry[2] is not None else ""
-    return name_zh != ""
+    # 逐欄以索引檢查，不切出 entry[:7] 的複本
+    for i in range(7):
+        if entry[i] is None:
+            return False
+    name_zh = entry[2]
+    return (name_zh if type(name_zh) is str else str(name_zh)).strip() != ""
 
 
 def upsert_nested(d: Dict, ban: str, year: str, payload: Dict[str, str]) -> None:
@@ -3,7 +3,7 @@
 
 """
 persistence.py
-狀態與資料持久化工具（state.json / hits.json / ok.json / errors.log）。
+狀態與資料持久化工具（state.json / hits.json / ok.json / 追加日誌 *.jsonl / errors.log）。
 
 更新重點：
 - BASE_DIR 會在 PyInstaller frozen 模式下指向 exe 同目錄（Path(sys.executable).parent），
@@ -12,13 +12,16 @@ persistence.py
 """
 
 from __future__ import annotations
-import json
+import atexit
 import os
 import sys
 import shutil
+import threading
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import IO, Dict, Any, List, Optional, Tuple
+
+from fbfh_trade import jsonutil
 
 # === 取得應用程式根目錄（exe 同目錄 / 或腳本目錄） ===
 def get_app_dir() -> Path:
@@ -32,32 +35,71 @@ def get_app_dir() -> Path:
 BASE_DIR = get_app_dir()
 BACKUP_KEEP = int(os.getenv("PERSIST_BACKUP_KEEP", "1"))
 BACKUP_ENABLED = os.getenv("PERSIST_BACKUP_DISABLE", "0") != "1"
+# 原子寫入前是否 fsync；設 PERSIST_FSYNC=0 可省去同步寫入等待（當機時可能遺失最後一次寫入，檔案仍不會半寫）
+FSYNC_ENABLED = os.getenv("PERSIST_FSYNC", "1") == "1"
 
 STATE_PATH = BASE_DIR / "state.json"
 HITS_PATH = BASE_DIR / "hits.json"
 OK_PATH = BASE_DIR / "ok.json"
+# hits.json / ok.json 的追加日誌：每筆只追加一行，checkpoint 時才整檔重寫 JSON 並清空日誌
+HITS_JOURNAL_PATH = BASE_DIR / "hits.jsonl"
+OK_JOURNAL_PATH = BASE_DIR / "ok.jsonl"
 ERR_LOG_PATH = BASE_DIR / "errors.log"
 
+# 多執行緒更新/寫出 hits、ok 與 state 時共用的鎖（runner 主執行緒與 api 致命停止路徑）
+SAVE_LOCK = threading.RLock()
+
 
 def _timestamp() -> str:
     return datetime.now().strftime("%Y%m%d-%H%M%S")
 
 
-def _atomic_write_text(path: Path, text: str) -> None:
-    """以原子方式寫入文字檔。"""
+def _atomic_write_bytes(path: Path, data: bytes) -> None:
+    """以原子方式寫入已編碼的內容（UTF-8 bytes）。"""
     tmp = path.with_suffix(path.suffix + ".tmp")
-    with tmp.open("w", encoding="utf-8") as f:
-        f.write(text)
-        f.flush()
-        os.fsync(f.fileno())
+    with tmp.open("wb") as f:
+        f.write(data)
+        if FSYNC_ENABLED:
+            f.flush()
+            os.fsync(f.fileno())
     os.replace(tmp, path)  # 原子置換
 
 
+def _same_content(path: Path, payload: bytes) -> bool:
+    """
+    檔案內容是否與 payload 完全相同：先比檔案大小，大小相同才以 64 KiB 分塊逐段比對，
+    不一次讀入整個檔案。檔案不存在或讀取失敗視為不同。
+    """
+    try:
+        if path.stat().st_size != len(payload):
+            return False
+        view = memoryview(payload)
+        pos = 0
+        with path.open("rb") as f:
+            while True:
+                chunk = f.read(65536)
+                if not chunk:
+                    return pos == len(payload)
+                if view[pos:pos + len(chunk)] != chunk:
+                    return False
+                pos += len(chunk)
+    except OSError:
+        return False
+
+
 def _list_backups(path: Path) -> List[Path]:
-    """列出同目錄下對應檔案的備份清單（依 mtime 新→舊排序）。"""
-    candidates = list(path.parent.glob(f"{path.name}.bak.*"))
-    candidates.sort(key=lambda p: p.stat().st_mtime, reverse=True)
-    return candidates
+    """
+    列出同目錄下對應檔案的備份清單（新→舊排序）。
+    備份檔名尾碼為 _timestamp() 的 YYYYMMDD-HHMMSS，字典序即時間序，直接依檔名排序，不需逐檔 stat。
+    """
+    prefix = f"{path.name}.bak."
+    try:
+        with os.scandir(path.parent) as it:
+            names = [entry.name for entry in it if entry.name.startswith(prefix)]
+    except OSError:
+        return []
+    names.sort(reverse=True)
+    return [path.parent / name for name in names]
 
 
 def _prune_backups(path: Path) -> None:
@@ -86,18 +128,49 @@ def _backup_if_exists(path: Path) -> None:
             _prune_backups(path)
 
 
+# errors.log 的持續開啟檔案把手（首次寫入時開啟；ERR_LOG_PATH 變更時重開）
+_err_fh: Optional[IO[bytes]] = None
+_err_fh_path: Optional[Path] = None
+_err_lock = threading.Lock()
+
+
+def _close_error_log() -> None:
+    global _err_fh
+    with _err_lock:
+        if _err_fh is not None:
+            try:
+                _err_fh.close()
+            except Exception:
+                pass
+            _err_fh = None
+
+
+atexit.register(_close_error_log)
+
+
 def append_error_log(title: str, details: Dict[str, Any]) -> None:
-    """將錯誤附加寫入 errors.log（逐行 JSON 物件）。"""
+    """
+    將錯誤附加寫入 errors.log（逐行 JSON 物件）。
+    檔案只開啟一次並重複使用；每筆寫入後立即 flush，程式隨後 sys.exit 或被中止也不會遺失。
+    """
+    global _err_fh, _err_fh_path
     ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     entry = {"time": ts, "title": title, "details": details}
-    with ERR_LOG_PATH.open("a", encoding="utf-8") as f:
-        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    line = jsonutil.dumps_compact(entry) + b"\n"
+    with _err_lock:
+        if _err_fh is None or _err_fh_path != ERR_LOG_PATH:
+            if _err_fh is not None:
+                _err_fh.close()
+            _err_fh = ERR_LOG_PATH.open("ab")
+            _err_fh_path = ERR_LOG_PATH
+        _err_fh.write(line)
+        _err_fh.flush()
 
 
 def _safe_load_json(path: Path) -> Dict:
     """讀取 JSON，失敗則把原檔轉存為 .corrupt.<ts> 並回傳空 dict。"""
     try:
-        return json.loads(path.read_text(encoding="utf-8"))
+        return jsonutil.load_path(path)
     except Exception as exc:
         corrupt = path.with_suffix(path.suffix + f".corrupt.{_timestamp()}")
         try:
@@ -115,7 +188,7 @@ def load_state() -> int:
     if not STATE_PATH.exists():
         return 0
     try:
-        data = json.loads(STATE_PATH.read_text(encoding="utf-8"))
+        data = jsonutil.load_path(STATE_PATH)
         return int(data.get("next_number", 0))
     except Exception as exc:
         corrupt = STATE_PATH.with_suffix(STATE_PATH.suffix + f".corrupt.{_timestamp()}")
@@ -126,20 +199,24 @@ def load_state() -> int:
         return 0
 
 
+# 本程序最後一次寫入（或確認相同）的 (STATE_PATH, next_number)；相同時 save_state 不再讀檔比對
+_last_saved_state: Optional[Tuple[Path, int]] = None
+
+
 def save_state(next_number: int) -> None:
     """
     寫入 state.json 的 next_number（原子寫入＋備份）。
-    若內容未變更則略過寫入與備份。
+    若與上次寫入的值相同，或檔案內容未變更，則略過寫入與備份。
     """
-    payload = json.dumps({"next_number": next_number}, ensure_ascii=False, indent=2)
-    if STATE_PATH.exists():
-        try:
-            if STATE_PATH.read_text(encoding="utf-8") == payload:
-                return  # 無變更，略過
-        except Exception:
-            pass
-    _backup_if_exists(STATE_PATH)
-    _atomic_write_text(STATE_PATH, payload)
+    global _last_saved_state
+    key = (STATE_PATH, next_number)
+    if key == _last_saved_state:
+        return  # 與上次寫入相同，略過
+    payload = jsonutil.dumps({"next_number": next_number})
+    if not _same_content(STATE_PATH, payload):
+        _backup_if_exists(STATE_PATH)
+        _atomic_write_bytes(STATE_PATH, payload)
+    _last_saved_state = key
 
 
 def load_json(path: Path) -> Dict:
@@ -157,12 +234,33 @@ def save_json(path: Path, obj: Dict) -> None:
     將 dict 寫回 JSON 檔（UTF-8, 縮排，原子寫入＋備份）。
     若內容未變更則略過寫入與備份。
     """
-    payload = json.dumps(obj, ensure_ascii=False, indent=2)
-    if path.exists():
-        try:
-            if path.read_text(encoding="utf-8") == payload:
-                return  # 無變更，略過
-        except Exception:
-            pass
+    payload = jsonutil.dumps(obj)
+    if _same_content(path, payload):
+        return  # 無變更，略過
     _backup_if_exists(path)
-    _atomic_write_text(path, payload)
+    _atomic_write_bytes(path, payload)
+
+
+def append_journal(fh: IO[bytes], ban_no: str, year: str, payload: Dict[str, Any]) -> None:
+    """追加一行 {"ban", "year", "payload"} 到已開啟（"ab"）的日誌檔並 flush（不 fsync）。"""
+    fh.write(jsonutil.dumps_compact({"ban": ban_no, "year": year, "payload": payload}) + b"\n")
+    fh.flush()
+
+
+def replay_journal(obj: Dict, path: Path) -> int:
+    """
+    將追加日誌的每一行併入 obj[ban][year]，回傳併入筆數。
+    日誌不存在時回 0；中斷時寫到一半的行會略過。重播已併入的行不影響結果。
+    """
+    if not path.exists():
+        return 0
+    merged = 0
+    with path.open("rb") as f:
+        for line in f:
+            try:
+                rec = jsonutil.loads(line)
+                obj.setdefault(rec["ban"], {})[rec["year"]] = rec["payload"]
+            except (ValueError, KeyError, TypeError):
+                continue
+            merged += 1
+    return merged
@@ -9,11 +9,30 @@ vat_utils.py
 from __future__ import annotations
 from typing import Generator, List, Tuple
 
+try:
+    # 可選：有 numpy 時 uniform_number_stream 改以向量化分批校驗
+    import numpy as np  # type: ignore
+except Exception:
+    np = None  # type: ignore
+
 WEIGHTS: List[int] = [1, 2, 1, 2, 1, 2, 4, 1]
 
+# 向量化校驗每批處理的候選號碼數（控制暫存陣列大小）
+STREAM_CHUNK = 65_536
+
+# 單一位數 × 權重的乘積只落在 0~36，預先算好位數和查表
+_SUM_DIGITS = tuple(i // 10 + i % 10 for i in range(40))
+
+# numpy 版本使用的常數（模組載入時建立一次）；號碼 < 10^8 可用 int32，逐位數字與乘積可用 int8
+if np is not None:
+    _POW10_NP = np.array([10 ** i for i in range(7, -1, -1)], dtype=np.int32)
+    _WEIGHTS_NP = np.array(WEIGHTS, dtype=np.int8)
+
 
 def sum_digits(n: int) -> int:
     """二位數字和（例如 18 -> 1 + 8 = 9）。"""
+    if 0 <= n < 40:
+        return _SUM_DIGITS[n]
     return n // 10 + n % 10
 
 
@@ -31,25 +50,58 @@ def explain_uniform_number(uniform_number: str) -> Tuple[List[int], List[int], i
     return products, per_digit_sums, z_total
 
 
+def _is_valid_int(n: int) -> bool:
+    """
+    以整數直接校驗 8 碼統編（0 <= n <= 99_999_999），規則同 is_valid_uniform_number。
+    逐位拆解與加權全部展開，不建立字串與 list；權重 1 的位數乘積只有一位數，位數和即本身，
+    其餘位數和查 _SUM_DIGITS。
+    """
+    n, d7 = divmod(n, 10)
+    n, d6 = divmod(n, 10)
+    n, d5 = divmod(n, 10)
+    n, d4 = divmod(n, 10)
+    n, d3 = divmod(n, 10)
+    n, d2 = divmod(n, 10)
+    d0, d1 = divmod(n, 10)
+    sd = _SUM_DIGITS
+    z = d0 + sd[d1 * 2] + d2 + sd[d3 * 2] + d4 + sd[d5 * 2] + sd[d6 * 4] + d7
+    return z % 5 == 0 or (d6 == 7 and (z + 1) % 5 == 0)
+
+
 def is_valid_uniform_number(uniform_number: str) -> bool:
     """是否為合法統編：Z % 5 == 0 或第七位是 7 且 (Z+1) % 5 == 0。"""
-    _, _, z = explain_uniform_number(uniform_number)
-    if z % 5 == 0:
-        return True
-    if uniform_number[6] == "7" and (z + 1) % 5 == 0:
-        return True
-    return False
+    if len(uniform_number) != 8 or not uniform_number.isdigit():
+        raise ValueError("統一編號必須是 8 碼數字字串。")
+    return _is_valid_int(int(uniform_number))
 
 
 def uniform_number_stream(start: str) -> Generator[str, None, None]:
     """
     從 start（含）開始產生合法統編字串（8 碼），直到 99_999_999 為止。
+    可載入 numpy 時以 STREAM_CHUNK 筆為一批向量化校驗，結果與逐筆校驗相同。
     """
     if len(start) != 8 or not start.isdigit():
         raise ValueError("start 必須是 8 碼數字字串。")
     n = int(start)
+    if np is not None:
+        yield from _uniform_number_stream_np(n)
+        return
+    # 以整數校驗，只有合法號碼才格式化成字串
     while n <= 99_999_999:
-        s = f"{n:08d}"
-        if is_valid_uniform_number(s):
-            yield s
+        if _is_valid_int(n):
+            yield f"{n:08d}"
         n += 1
+
+
+def _uniform_number_stream_np(lo: int) -> Generator[str, None, None]:
+    """uniform_number_stream 的 numpy 版本：每批一次算出所有候選號碼的 Z 與合法遮罩。"""
+    while lo <= 99_999_999:
+        hi = min(lo + STREAM_CHUNK, 100_000_000)
+        n = np.arange(lo, hi, dtype=np.int32)
+        digits = ((n[:, None] // _POW10_NP) % 10).astype(np.int8)   # (N, 8) 逐位數字
+        products = digits * _WEIGHTS_NP
+        z = (products // 10 + products % 10).sum(axis=1)
+        mask = (z % 5 == 0) | ((digits[:, 6] == 7) & ((z + 1) % 5 == 0))
+        for v in n[mask].tolist():
+            yield f"{v:08d}"
+        lo = hi
@@ -5,13 +5,14 @@
 
 from __future__ import annotations
 
-import json
+import itertools
 from pathlib import Path
 from typing import Any, Dict, Optional, Tuple
 
 from openpyxl import load_workbook
 
 import fbfh_trade.logger as log
+from fbfh_trade import jsonutil
 from fbfh_trade.company.builder import build_and_save
 from fbfh_trade.company.exporter import main as export_excel
 from fbfh_trade.persistence import BASE_DIR  # 關鍵：exe 同目錄
@@ -24,8 +25,7 @@ OUTPUT_XLSX_NAME = "company_details.xlsx"
 def _load_existing(path: Path) -> Tuple[Dict[str, Dict[str, Any]], Optional[Tuple[str, str]]]:
     if not path.exists():
         return {}, None
-    with path.open("r", encoding="utf-8") as f:
-        data: Dict[str, Dict[str, Any]] = json.load(f)
+    data: Dict[str, Dict[str, Any]] = jsonutil.load_path(path)
 
     last_ban: Optional[str] = None
     last_year: Optional[str] = None
@@ -43,36 +43,47 @@ def _load_existing(path: Path) -> Tuple[Dict[str, Dict[str, Any]], Optional[Tupl
 def _excel_last_pair(path: Path) -> Optional[Tuple[str, str]]:
     if not path.exists():
         return None
-    wb = load_workbook(path)
-    ws = wb.active
-    for row in range(ws.max_row, 0, -1):
-        tax = ws.cell(row=row, column=1).value
-        year = ws.cell(row=row, column=6).value
-        if tax is not None:
-            return str(tax), str(year)
-    return None
+    # 唯讀串流模式單次順向掃描，只保留最後一個非空列（不建立整張工作表、不隨機存取儲存格）
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb.active
+        last: Optional[Tuple[str, str]] = None
+        for row in ws.iter_rows(min_col=1, max_col=6, values_only=True):
+            if row and row[0] is not None:
+                year = row[5] if len(row) > 5 else None
+                last = (str(row[0]), str(year))
+        return last
+    finally:
+        wb.close()
 
 
 def _slice_hits_after(path: Path, last_pair: Optional[Tuple[str, str]]) -> Dict[str, Dict[str, Any]]:
-    with path.open("r", encoding="utf-8") as f:
-        hits = json.load(f)
+    hits = jsonutil.load_path(path)
 
     if not last_pair:
         return hits
 
-    started = False
-    sliced: Dict[str, Dict[str, Any]] = {}
-    for ban_no, years in hits.items():
-        for year, meta in years.items():
-            if not started:
-                if ban_no == last_pair[0] and year == last_pair[1]:
-                    started = True
-                continue
-            sliced.setdefault(ban_no, {})[year] = meta
-
-    if not started:
+    # 以 dict 查詢直接定位最後處理的 (統編, 年度)，不逐筆比對；
+    # 之後的統編依 hits.json 原順序整筆沿用，不逐年度複製
+    ban_no, year = last_pair
+    years = hits.get(ban_no)
+    if not isinstance(years, dict) or year not in years:
         log.warn("在 hits.json 中找不到最後處理的紀錄，將從頭開始處理。")
         return hits
+
+    sliced: Dict[str, Dict[str, Any]] = {}
+    year_keys = list(years)
+    rest = year_keys[year_keys.index(year) + 1:]
+    if rest:
+        sliced[ban_no] = {y: years[y] for y in rest}
+
+    # 單趟走訪 hits：略過 ban_no（含）之前的統編，不建立統編 list 也不線性搜尋位置
+    later_bans = itertools.dropwhile(lambda ban: ban != ban_no, hits)
+    next(later_bans)  # ban_no 本身（上方已確認存在）
+    for ban in later_bans:
+        later = hits[ban]
+        if later:
+            sliced[ban] = later
     return sliced
 
 
@@ -102,8 +113,7 @@ def run_pipeline() -> None:
         return
 
     tmp_hits = base / "hits.partial.json"
-    with tmp_hits.open("w", encoding="utf-8") as f:
-        json.dump(hits_to_process, f, ensure_ascii=False, indent=2)
+    tmp_hits.write_bytes(jsonutil.dumps(hits_to_process))
 
     tmp_output = base / "company_details.partial.json"
     result = build_and_save(input_path=str(tmp_hits), output_path=str(tmp_output), timeout=10)
@@ -116,8 +126,7 @@ def run_pipeline() -> None:
     for ban_no, years in result.items():
         existing.setdefault(ban_no, {}).update(years)
 
-    with output_path.open("w", encoding="utf-8") as f:
-        json.dump(existing, f, ensure_ascii=False, indent=2)
+    output_path.write_bytes(jsonutil.dumps(existing))
 
     export_excel()
 
@@ -8,16 +8,18 @@ pre_run_check.py
 """
 from __future__ import annotations
 
-import json
 import sys
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Tuple
 
-from openpyxl import load_workbook
+try:
+    # 可選：有 ijson 時以串流事件計算 pair 數，不建立整棵 JSON 物件
+    import ijson  # type: ignore
+except Exception:
+    ijson = None  # type: ignore
 
 import fbfh_trade.logger as log
-from fbfh_trade.company.builder import build_and_save
-from fbfh_trade.company.exporter import main as export_excel
+from fbfh_trade import jsonutil
 from fbfh_trade.persistence import BASE_DIR, HITS_PATH
 
 COMPANY_DETAILS_JSON = BASE_DIR / "company_details.json"
@@ -33,14 +35,45 @@ def _load_json(path: Path) -> Dict:
     if not path.exists():
         return {}
     try:
-        with path.open("r", encoding="utf-8") as f:
-            return json.load(f)
+        return jsonutil.load_path(path)
     except Exception:
         return {}
 
 
+def _stream_pair_count(path: Path) -> int:
+    """
+    以 ijson 事件串流計算 ban/year pair 數：只數第二層（年度）的 map_key，
+    不建立任何 payload 物件。解析失敗回 0（同 _load_json 的行為）。
+    """
+    try:
+        with path.open("rb") as f:
+            return sum(
+                1
+                for prefix, event, _ in ijson.parse(f)
+                if event == "map_key" and prefix and "." not in prefix
+            )
+    except Exception:
+        return 0
+
+
+# path -> (st_mtime_ns, st_size, pair 數)；檔案未變動時不重新解析
+_pair_count_cache: Dict[Path, Tuple[int, int, int]] = {}
+
+
 def _count_json_pairs(path: Path) -> int:
-    return _pair_count(_load_json(path))
+    try:
+        st = path.stat()
+    except OSError:
+        return 0
+    cached = _pair_count_cache.get(path)
+    if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+        return cached[2]
+    if ijson is not None:
+        count = _stream_pair_count(path)
+    else:
+        count = _pair_count(_load_json(path))
+    _pair_count_cache[path] = (st.st_mtime_ns, st.st_size, count)
+    return count
 
 
 def _count_excel_rows(path: Path) -> int:
@@ -50,24 +83,23 @@ def _count_excel_rows(path: Path) -> int:
     """
     if not path.exists():
         return 0
+    from openpyxl import load_workbook  # 延後匯入：只有實際檢查 Excel 時才需要
+
     try:
         wb = load_workbook(path, read_only=True, data_only=True)
         ws = wb.active
     except Exception:
         return 0
 
-    # 明確自第 2 列（跳過標題列）開始統計
-    start_row = 2
-    if ws.max_row < start_row:
-        return 0
-
-    count = 0
-    for row in range(start_row, ws.max_row + 1):
-        c1 = ws.cell(row=row, column=1).value
-        c2 = ws.cell(row=row, column=2).value
-        if c1 is not None and c2 is not None:
-            count += 1
-    return count
+    # 明確自第 2 列（跳過標題列）開始統計；只串流讀前兩欄的值，不建立 Cell 物件
+    try:
+        return sum(
+            1
+            for c1, c2 in ws.iter_rows(min_row=2, max_col=2, values_only=True)
+            if c1 is not None and c2 is not None
+        )
+    finally:
+        wb.close()
 
 
 def run_checks() -> None:
@@ -79,6 +111,8 @@ def run_checks() -> None:
         if json_cnt > xlsx_cnt:
             log.warn("company_details.xlsx 落後，準備自動更新…")
             prev = xlsx_cnt
+            from fbfh_trade.company.exporter import main as export_excel
+
             export_excel()
             new_cnt = _count_excel_rows(COMPANY_DETAILS_XLSX)
 
@@ -101,6 +135,8 @@ def run_checks() -> None:
         if hits_cnt > json_cnt:
             log.warn("company_details.json 落後，準備自動更新…")
             prev = json_cnt
+            from fbfh_trade.company.builder import build_and_save
+
             build_and_save(
                 input_path=str(HITS_PATH),
                 output_path=str(COMPANY_DETAILS_JSON),
@@ -7,13 +7,22 @@ runner.py
 - 改用內建 logger 輸出（進度亦改為 logger，每 N 筆一行）
 - 新增 --cooldown-on-warn 參數供 429 退避基準秒數使用
 - 啟動時輸出現有 ok/hits 的統計，方便確認不是空集合起跑
+- 以執行緒池同時送出 --concurrency 筆請求，結果依統編順序處理與落盤
+- HIT/OK 紀錄逐筆追加到 hits.jsonl / ok.jsonl，checkpoint 時才整檔重寫 hits.json / ok.json
+- 命中後只增量補抓該筆公司明細（背景執行緒，追加到 company_details.jsonl），
+  company_details.json / Excel 只在 checkpoint 與結束時整檔寫回與匯出
 """
 
 from __future__ import annotations
 import argparse
+import queue
+import signal
 import sys
+import threading
 import time
-from typing import Optional, Dict
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import fbfh_trade.logger as log
 
@@ -23,26 +32,114 @@ from fbfh_trade.persistence import (
     load_json,
     save_json,
     append_error_log,
+    append_journal,
+    replay_journal,
     HITS_PATH,
+    HITS_JOURNAL_PATH,
     OK_PATH,
+    OK_JOURNAL_PATH,
     BASE_DIR,
+    SAVE_LOCK,
 )
 from fbfh_trade.vat import uniform_number_stream  # 產生合法統編
 from fbfh_trade.http import create_session  # Session 與重試
-from fbfh_trade.api import post_company_with_429_retry  # 單筆 API 呼叫與 429 重試
+from fbfh_trade.api import (  # 單筆 API 呼叫與 429 重試
+    configure_concurrency,
+    post_company_with_429_retry,
+    set_rate_limit,
+)
 from fbfh_trade.parsing import pick_year_row, is_A_to_K, row_is_normal, upsert_nested  # 解析回應資料
 from pathlib import Path
-from fbfh_trade.company.builder import build_and_save
-from fbfh_trade.company.exporter import main as export_excel
 
 COMPANY_DETAILS_PATH = BASE_DIR / "company_details.json"
+# builder.append_one / build_and_save 的追加檢查點（格式與 hits.jsonl 相同）
+COMPANY_DETAILS_JOURNAL_PATH = COMPANY_DETAILS_PATH.with_suffix(".jsonl")
 
+# 背景執行緒佇列的項目：命中 (統編, 年度, hits.json 中該筆內容)，或控制項——
+# _COMPACT 要求整檔寫回 company_details.json 並匯出 Excel；None 要求寫回後結束
+_COMPACT = object()
 
-def _pair_count(d: Dict) -> int:
-    try:
-        return sum(len(v) for v in d.values() if isinstance(v, dict))
-    except Exception:
-        return 0
+# 結束時等待背景執行緒補抓的最長秒數；逾時即停止補抓（未完成的留在 hits.json，下次啟動對齊時補上），
+# 之後的整檔寫回仍會等到完成
+DETAILS_JOIN_TIMEOUT_SEC = 30.0
+
+# 統編不在 ok/hits 時供年度查詢用的空 dict（唯讀）
+_NO_YEARS: Dict[str, Dict[str, str]] = {}
+
+# 進度行格式（printf 風格，交給 logger 在輸出時才格式化）
+_PROGRESS_FMT = "進度｜目前處理到: %08d（最後合法: %s）｜已處理合法數: %d｜RPS: %.2f"
+
+
+def _build_details_and_export() -> Dict:
+    """
+    以 hits.json 補齊 company_details.json 並重新匯出 Excel，回傳補齊後的 company_details 內容。
+    builder/exporter（連帶 openpyxl）在第一次需要時才匯入，一般查詢不必載入。
+    """
+    from fbfh_trade.company.builder import build_and_save
+    from fbfh_trade.company.exporter import main as export_excel
+
+    details = build_and_save(
+        input_path=str(HITS_PATH),
+        output_path=str(COMPANY_DETAILS_PATH),
+    )
+    export_excel()
+    return details
+
+
+def _details_worker(items_q: "queue.Queue[object]", details: Dict, stop: threading.Event) -> None:
+    """
+    背景執行緒：把命中的 (統編, 年度, hits 內容) 逐筆增量補進常駐的 details（不重讀 hits.json、不全量比對），
+    每筆只追加到 company_details.jsonl；收到 _COMPACT（checkpoint）或 None（結束）時，
+    若有新資料才整檔寫回 company_details.json 並匯出 Excel。
+    stop 被設定後不再補抓，剩下的命中已在 hits.json，下次啟動對齊時補上。
+    """
+    dirty = False
+    while True:
+        item = items_q.get()
+        if item is None or item is _COMPACT:
+            if dirty:
+                from fbfh_trade.company.builder import save_output
+                from fbfh_trade.company.exporter import main as export_excel
+
+                try:
+                    save_output(details, str(COMPANY_DETAILS_PATH))
+                    export_excel()
+                    dirty = False
+                except (Exception, SystemExit) as exc:  # exporter 失敗時以 sys.exit 結束
+                    log.error(f"save/export failed: {exc!r}")
+            if item is None:
+                return
+            continue
+        if stop.is_set():
+            continue
+
+        ban_no, year, meta = item  # type: ignore[misc]  # (統編, 年度, hits 內容)
+        if year in details.get(ban_no, _NO_YEARS):
+            # 已有資料（例如重複排入）：不補抓，也不觸發 checkpoint 時的整檔寫回
+            continue
+
+        from fbfh_trade.company.builder import append_one
+
+        try:
+            if append_one(details, ban_no, year, meta, output_path=str(COMPANY_DETAILS_PATH), stop=stop):
+                dirty = True
+        except InterruptedError:
+            continue
+        except Exception as exc:
+            log.error(f"append_one failed: {ban_no}-{year} {exc!r}")
+
+
+def _missing_pairs(hits: Dict, details: Dict) -> List[Tuple[str, str]]:
+    """hits 有、details 沒有的 (統編, 年度)；details 多出的資料不算缺漏。"""
+    missing: List[Tuple[str, str]] = []
+    for ban, years in hits.items():
+        if not isinstance(years, dict):
+            continue
+        have = details.get(ban)
+        if not isinstance(have, dict):
+            have = _NO_YEARS
+        missing.extend((ban, year) for year in years if year not in have)
+    return missing
 
 
 def _interactive_args_if_needed() -> None:
@@ -85,25 +182,42 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--start", default=None,
                         help="起始 8 碼（含）。不指定則讀 state.json。")
     parser.add_argument("--sleep", type=float,
-                        default=0.0, help="每次 API 呼叫間隔秒數。")
+                        default=0.0, help="每次 API 呼叫間隔秒數（固定延遲；建議改用 --max-rpm）。")
+    parser.add_argument("--max-rpm", type=float, default=0.0,
+                        help="全部請求共用的每分鐘請求數上限；0 表示不限制（仍依 429 與 X-RateLimit-* 標頭自動節流）。")
     parser.add_argument(
         "--checkpoint-every", type=int, default=200, help="每處理 N 個合法統編就落盤。"
     )
     parser.add_argument(
         "--progress-every", type=int, default=20, help="每處理 N 個合法統編就輸出一次進度。"
     )
+    parser.add_argument(
+        "--progress-interval", type=float, default=1.0,
+        help="兩次進度輸出的最短間隔秒數（0 表示不限）。",
+    )
     parser.add_argument("--pool-size", type=int,
                         default=20, help="HTTP 連線池大小。")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="同時進行的 API 請求數（不超過 --pool-size）；1 即逐筆查詢。")
+    parser.add_argument("--aimd-min", type=int, default=1,
+                        help="AIMD 自動調整時同時進行中請求數的下限。")
+    parser.add_argument("--aimd-max", type=int, default=0,
+                        help="AIMD 自動調整時同時進行中請求數的上限；0 表示等於 --concurrency。")
     parser.add_argument("--retries", type=int,
-                        default=3, help="失敗重試次數（非 429）。")
+                        default=3, help="連線錯誤與 5xx 的重試次數（非 429）。")
     parser.add_argument("--backoff", type=float,
-                        default=0.3, help="重試退避因子（非 429）。")
+                        default=0.3, help="連線錯誤重試的退避因子（5xx 與 429 共用 --cooldown-on-warn 退避）。")
     parser.add_argument(
         "--max-429-retries",
         type=int,
         default=-1,
         help="同一 BAN 碰到 429 的最大重試次數；-1 代表無限重試。",
     )
+    parser.add_argument(
+        "--skip-known",
+        action="store_true",
+        help="略過本年度已記錄在 ok.json/hits.json、且位於上次保存進度之前的統編（不重新查詢）；預設關閉，重跑區間會刷新資料。",
+    )
     parser.add_argument("--timeout", type=float,
                         default=10.0, help="單次請求逾時秒數。")
     parser.add_argument(
@@ -125,162 +239,262 @@ def _count_nested(d: Dict) -> str:
         return "0 個BAN / 0 個年度資料"
 
 
+def _raise_keyboard_interrupt(signum, frame) -> None:
+    """SIGTERM 視同 Ctrl+C：走同一條「等待進行中請求 → 落盤 state/hits/ok」的中斷路徑。"""
+    raise KeyboardInterrupt
+
+
+def _ordered_results(
+    gen: Iterable[str],
+    submit: Callable[[str], Future],
+    window: int,
+    sleep: float,
+) -> Iterator[Tuple[str, Future]]:
+    """
+    依序送出統編，同時最多 window 筆請求進行中；依送出順序回傳 (統編, future)。
+    呼叫端依序取結果，hits/ok 的更新順序與 checkpoint 水位線因此與序列版相同。
+    """
+    inflight: Deque[Tuple[str, Future]] = deque()
+    for vat in gen:
+        inflight.append((vat, submit(vat)))
+        if len(inflight) >= window:
+            yield inflight.popleft()
+        # 呼叫節流
+        if sleep > 0:
+            time.sleep(sleep)
+    while inflight:
+        yield inflight.popleft()
+
+
 def main() -> None:
     """主執行流程。"""
     args = parse_args()
 
-    # 決定續跑起點（整數位置）
-    start_int = int(args.start) if args.start else load_state()
+    # 決定續跑起點（整數位置）；saved_int 為上次保存的水位線，之前的統編皆已完整處理並落盤
+    saved_int = load_state()
+    start_int = int(args.start) if args.start else saved_int
     start_valid = f"{start_int:08d}"
 
     # 載入既有結果（若檔毀損會被移到 .corrupt.<ts>，並回傳空 dict）
     hits = load_json(HITS_PATH)
     ok_map = load_json(OK_PATH)
+    # 上次未 checkpoint 的紀錄留在 *.jsonl：併入後整檔寫回 JSON，再清空日誌
+    for store, path, journal in ((hits, HITS_PATH, HITS_JOURNAL_PATH), (ok_map, OK_PATH, OK_JOURNAL_PATH)):
+        if replay_journal(store, journal):
+            save_json(path, store)
+        journal.unlink(missing_ok=True)
+    # 公司明細補抓中斷時留下的 company_details.jsonl 同樣先併入，之後的缺漏比對才準確
     details = load_json(COMPANY_DETAILS_PATH)
+    details_replayed = replay_journal(details, COMPANY_DETAILS_JOURNAL_PATH)
+    if details_replayed:
+        save_json(COMPANY_DETAILS_PATH, details)
+    COMPANY_DETAILS_JOURNAL_PATH.unlink(missing_ok=True)
 
     # 啟動時輸出載入統計，避免一開始就「空集合」卻沒感覺到
     log.info(f"載入 ok.json：{_count_nested(ok_map)}")
     log.info(f"載入 hits.json：{_count_nested(hits)}")
-    if _pair_count(details) != _pair_count(hits):
+    # 以 (統編, 年度) 差集判斷缺漏；build_and_save 本身只補抓缺的部分，跑一次即可，
+    # 仍有缺漏（例如查無資料）就留待下次啟動，不在這裡反覆重建
+    missing = _missing_pairs(hits, details)
+    if missing:
         log.info(
-            "company_details.json 與 hits.json 進度不一致，先行建置 company_details.json 並更新 Excel…"
+            f"company_details.json 缺少 hits.json 的 {len(missing)} 筆資料，先行建置 company_details.json 並更新 Excel…"
         )
-        while _pair_count(details) != _pair_count(hits):
-            try:
-                build_and_save(
-                    input_path=str(HITS_PATH),
-                    output_path=str(COMPANY_DETAILS_PATH),
-                )
-                export_excel()
-            except Exception as exc:
-                log.error(f"build_and_save/export failed: {exc!r}")
-                break
-            details = load_json(COMPANY_DETAILS_PATH)
+        try:
+            details = _build_details_and_export()
+        except Exception as exc:
+            log.error(f"build_and_save/export failed: {exc!r}")
+        else:
+            missing = _missing_pairs(hits, details)
+            if missing:
+                log.warn(f"company_details.json 仍缺 {len(missing)} 筆（例如 {missing[0][0]}-{missing[0][1]}），下次啟動再補。")
+    elif details_replayed:
+        # 無缺漏但剛併入檢查點：Excel 尚未包含這些資料，重新匯出一次
+        from fbfh_trade.company.exporter import main as export_excel
+
+        try:
+            export_excel()
+        except (Exception, SystemExit) as exc:  # exporter 失敗時以 sys.exit 結束
+            log.error(f"export failed: {exc!r}")
     log.info(f"續跑起點：{start_valid}")
 
     # 初始化生成器與 HTTP session
     gen = uniform_number_stream(start_valid)
     session = create_session(pool_size=args.pool_size,
                              retries=args.retries, backoff=args.backoff)
+    concurrency = max(1, min(args.concurrency, args.pool_size))
+    set_rate_limit(args.max_rpm)
+    # 遇 429/5xx 時自動降低實際並行數，恢復後再逐步調回（不超過 --concurrency）
+    configure_concurrency(args.aimd_min, min(args.aimd_max or concurrency, concurrency))
+    pool = ThreadPoolExecutor(max_workers=concurrency)
+    # 中斷或停止時設定：進行中的請求不再重試、退避等待立刻結束，pool.shutdown 不會卡在 429 迴圈
+    stop = threading.Event()
+    year = str(args.year)
+
+    def _submit(vat: str) -> Future:
+        # --skip-known：以 --start 重跑已掃過的區間時，本年度已記錄在 ok/hits 的統編不再送出請求，
+        # 回傳已完成、結果為 None 的 future（照常計入進度與水位線，但不更新任何資料）。
+        # 只略過上次保存水位線之前的統編：水位線上的那筆可能在 ok/hits 更新到一半時中斷，必須重查
+        if args.skip_known and int(vat) < saved_int and (
+            year in ok_map.get(vat, _NO_YEARS) or year in hits.get(vat, _NO_YEARS)
+        ):
+            done: Future = Future()
+            done.set_result(None)
+            return done
+        return pool.submit(
+            post_company_with_429_retry,
+            ban_no=vat,
+            session=session,
+            timeout=args.timeout,
+            max_429_retries=args.max_429_retries,
+            cooldown_on_warn=args.cooldown_on_warn,
+            hits=hits,
+            ok_map=ok_map,
+            last_legal=vat,
+            start_int=start_int,
+            max_5xx_retries=args.retries,
+            stop=stop,
+        )
+
+    # 命中時的公司明細補抓與 company_details/Excel 更新交給背景執行緒，查詢迴圈不等待；
+    # 全量 build_and_save 只留在上方的啟動對齊流程
+    details_q: "queue.Queue[object]" = queue.Queue()
+    details_worker = threading.Thread(target=_details_worker, args=(details_q, details, stop), daemon=True)
+    details_worker.start()
+
+    # hits.json / ok.json 的追加日誌（整檔重寫與 fsync 只在 checkpoint 與結束時進行）
+    hits_journal = HITS_JOURNAL_PATH.open("ab")
+    ok_journal = OK_JOURNAL_PATH.open("ab")
+
+    def _checkpoint(next_number: int) -> None:
+        """落盤 state/hits/ok（原子寫入＋備份由 persistence 保障），JSON 寫回後清空日誌。"""
+        with SAVE_LOCK:
+            save_state(next_number)
+            save_json(HITS_PATH, hits)
+            save_json(OK_PATH, ok_map)
+            hits_journal.truncate(0)
+            ok_journal.truncate(0)
+        # company_details.json / Excel 的整檔寫回交給背景執行緒，跟在已排入的補抓之後
+        details_q.put(_COMPACT)
+        log.flush()
+
+    # 被終止（SIGTERM）時同樣寫回 checkpoint 之後累積的結果
+    signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)
 
     processed = 0
-    t0 = time.time()
+    t0 = time.monotonic()
+    last_progress = float("-inf")
+    # 最後一個「依序處理完成」的統編；之前的統編皆已落入 hits/ok，作為 checkpoint 水位線
     last_legal: Optional[str] = None
+    # 目前正在等待結果的統編（工作執行緒致命停止時的續跑點）
+    pending: Optional[str] = None
 
+    # 互動輸入已結束：掃描期間的 log 交給背景執行緒批次寫出，熱迴圈不等主控台/檔案 I/O；
+    # 每次 checkpoint 與結束時 flush，結束後恢復直接輸出
+    log.set_buffering(True)
     try:
-        for vat in gen:
-            last_legal = vat
-
-            data = post_company_with_429_retry(
-                ban_no=vat,
-                session=session,
-                timeout=args.timeout,
-                max_429_retries=args.max_429_retries,
-                cooldown_on_warn=args.cooldown_on_warn,
-                hits=hits,
-                ok_map=ok_map,
-                last_legal=last_legal,
-                start_int=start_int,
-            )
-
-            # 解析與存檔
-            if data:
-                row = pick_year_row(data, str(args.year))
-                if row:
-                    name_zh = row[2] if len(row) > 2 else None
-                    name_en = row[3] if len(row) > 3 else None
-                    import_grade = row[4] if len(row) > 4 else None
-                    export_grade = row[5] if len(row) > 5 else None
-
-                    # 正常資料 → 記錄至 ok.json
-                    if row_is_normal(row):
-                        upsert_nested(
-                            ok_map,
-                            vat,
-                            str(args.year),
-                            {
+        for vat, future in _ordered_results(gen, _submit, concurrency, args.sleep):
+            pending = vat
+            data = future.result()
+
+            # 解析與存檔（持有 SAVE_LOCK，避免與工作執行緒的致命停止同時寫檔）
+            with SAVE_LOCK:
+                if data:
+                    row = pick_year_row(data, year)
+                    if row:
+                        name_zh = row[2] if len(row) > 2 else None
+                        name_en = row[3] if len(row) > 3 else None
+                        import_grade = row[4] if len(row) > 4 else None
+                        export_grade = row[5] if len(row) > 5 else None
+
+                        # 正常資料 → 記錄至 ok.json
+                        if row_is_normal(row):
+                            payload = {
                                 "name_zh": str(name_zh) if name_zh is not None else "",
                                 "name_en": str(name_en) if name_en is not None else "",
                                 "import_total": str(import_grade) if import_grade is not None else "",
                                 "export_total": str(export_grade) if export_grade is not None else "",
-                            },
-                        )
-                        save_json(OK_PATH, ok_map)
-                        log.info(
-                            f"OK  {vat}  year={args.year}  name_zh={str(name_zh).strip() if name_zh else ''}"
-                        )
+                            }
+                            upsert_nested(ok_map, vat, year, payload)
+                            append_journal(ok_journal, vat, year, payload)
+                            log.info(
+                                f"OK  {vat}  year={args.year}  name_zh={str(name_zh).strip() if name_zh else ''}"
+                            )
 
-                    # 命中特殊等第（A~K） → 記錄至 hits.json
-                    if is_A_to_K(import_grade) or is_A_to_K(export_grade):
-                        upsert_nested(
-                            hits,
-                            vat,
-                            str(args.year),
-                            {
+                        # 命中特殊等第（A~K） → 記錄至 hits.json
+                        if is_A_to_K(import_grade) or is_A_to_K(export_grade):
+                            hit_payload = {
                                 "name_zh": str(name_zh) if name_zh is not None else "",
                                 "name_en": str(name_en) if name_en is not None else "",
                                 "import_total": str(import_grade) if import_grade is not None else "",
                                 "export_total": str(export_grade) if export_grade is not None else "",
-                            },
-                        )
-                        save_json(HITS_PATH, hits)
+                            }
+                            upsert_nested(hits, vat, year, hit_payload)
+                            append_journal(hits_journal, vat, year, hit_payload)
+                            log.info(
+                                f"HIT {vat}  year={args.year}  import={import_grade}  export={export_grade}"
+                            )
+                            details_q.put((vat, year, hit_payload))
+
+                last_legal = vat
+                processed += 1
+
+                # 進度顯示（用 logger，每 N 筆且距上次至少 --progress-interval 秒才輸出一行）
+                if processed % args.progress_every == 0:
+                    now = time.monotonic()
+                    if now - last_progress >= args.progress_interval:
+                        last_progress = now
+                        rps = processed / max(1e-6, now - t0)
                         log.info(
-                            f"HIT {vat}  year={args.year}  import={import_grade}  export={export_grade}"
+                            _PROGRESS_FMT, int(vat) + 1, last_legal, processed, rps
                         )
-                        try:
-                            build_and_save(
-                                input_path=str(HITS_PATH),
-                                output_path=str(COMPANY_DETAILS_PATH),
-                            )
-                            export_excel()
-                        except Exception as exc:
-                            log.error(f"build_and_save/export failed: {exc!r}")
-
-            processed += 1
-
-            # 進度顯示（用 logger，每 N 筆一行）
-            if processed % args.progress_every == 0:
-                elapsed = max(1e-6, time.time() - t0)
-                rps = processed / elapsed
-                next_number = int(vat) + 1
-                log.info(
-                    f"進度｜目前處理到: {next_number:08d}（最後合法: {last_legal}）"
-                    f"｜已處理合法數: {processed}｜RPS: {rps:.2f}"
-                )
-
-            # 定期 checkpoint（原子寫入＋備份由 persistence 保障）
-            if processed % args.checkpoint_every == 0:
-                next_number = int(vat) + 1
-                save_state(next_number)
-                save_json(HITS_PATH, hits)
-                save_json(OK_PATH, ok_map)
-
-            # 呼叫節流
-            if args.sleep > 0:
-                time.sleep(args.sleep)
+
+                # 定期 checkpoint（原子寫入＋備份由 persistence 保障）
+                if processed % args.checkpoint_every == 0:
+                    next_number = int(vat) + 1
+                    _checkpoint(next_number)
 
     except KeyboardInterrupt:
+        # 先等進行中的請求結束，確保最後寫入的是主執行緒的水位線
+        log.info("\n已中斷，等待進行中的請求結束…")
+        stop.set()
+        pool.shutdown(wait=True, cancel_futures=True)
         next_number = int(last_legal) + 1 if last_legal else start_int
-        save_state(next_number)
-        save_json(HITS_PATH, hits)
-        save_json(OK_PATH, ok_map)
-        log.info(f"\n已中斷，狀態已保存。下次將從 {next_number:08d} 繼續。")
+        _checkpoint(next_number)
+        log.info(f"已中斷，狀態已保存。下次將從 {next_number:08d} 繼續。")
     except SystemExit:
+        # 工作執行緒已致命停止並落盤；但當時主執行緒可能尚未處理完較早的統編，
+        # 等其餘請求結束後，以出錯統編重寫 state/hits/ok（包含其之前已處理的結果）
+        stop.set()
+        pool.shutdown(wait=True, cancel_futures=True)
+        if pending is not None:
+            _checkpoint(int(pending))
         raise
     except Exception as exc:
+        stop.set()
+        pool.shutdown(wait=True, cancel_futures=True)
         next_number = int(last_legal) + 1 if last_legal else start_int
-        save_state(next_number)
-        save_json(HITS_PATH, hits)
-        save_json(OK_PATH, ok_map)
+        _checkpoint(next_number)
         append_error_log("Unhandled exception", {"error": repr(exc)})
         log.error(f"\n[STOP] 未預期錯誤：{exc!r}，狀態已保存。")
         sys.exit(1)
     else:
+        pool.shutdown()
         next_number = 100_000_000
-        save_state(next_number)
-        save_json(HITS_PATH, hits)
-        save_json(OK_PATH, ok_map)
+        _checkpoint(next_number)
         log.info("\n已完成全部區間掃描。")
+    finally:
+        hits_journal.close()
+        ok_journal.close()
+        # 等背景執行緒處理完已排入的命中再結束；補抓逾時則要求停止（未補完的留待下次啟動對齊），
+        # 但最後的整檔寫回 company_details.json / Excel 不設時限，避免程式結束時寫到一半
+        details_q.put(None)
+        details_worker.join(DETAILS_JOIN_TIMEOUT_SEC)
+        if details_worker.is_alive():
+            stop.set()
+            log.warn("公司明細補抓未在時限內完成，未補齊的部分將於下次啟動時補上；等待寫回…")
+            details_worker.join()
+        log.set_buffering(False)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+pytest 共用設定：讓測試可匯入 fbfh_trade 與 scripts/runner.py，並把所有讀寫檔案導向 tmp_path。
+"""
+
+from __future__ import annotations
+
+import importlib.util
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from fbfh_trade import persistence  # noqa: E402
+
+
+def load_script(name: str):
+    """
+    以檔案路徑載入 scripts/<name>.py（scripts 不是套件）。
+    runner 匯入時若沒有命令列參數會互動詢問，故載入期間先放入參數。
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    argv = sys.argv
+    sys.argv = [f"{name}.py", "--year", "113"]
+    try:
+        spec = importlib.util.spec_from_file_location(name, ROOT / "scripts" / f"{name}.py")
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+    finally:
+        sys.argv = argv
+    return module
+
+
+@pytest.fixture
+def runner(tmp_path, monkeypatch):
+    """回傳 runner 模組；state/hits/ok/company_details 及其日誌都改寫到 tmp_path。"""
+    module = load_script("runner")
+    monkeypatch.setattr(persistence, "STATE_PATH", tmp_path / "state.json")
+    monkeypatch.setattr(persistence, "ERR_LOG_PATH", tmp_path / "errors.log")
+    monkeypatch.setattr(persistence, "_last_saved_state", None)
+    for name in ("HITS_PATH", "OK_PATH", "HITS_JOURNAL_PATH", "OK_JOURNAL_PATH"):
+        monkeypatch.setattr(module, name, tmp_path / getattr(persistence, name).name)
+    monkeypatch.setattr(module, "COMPANY_DETAILS_PATH", tmp_path / "company_details.json")
+    monkeypatch.setattr(module, "COMPANY_DETAILS_JOURNAL_PATH", tmp_path / "company_details.jsonl")
+    return module
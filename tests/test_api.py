@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""fbfh_trade.api 的全域節流元件：_ControlState 的速率上限與冷卻期。時間以假時鐘控制，不實際等待。"""
+
+from __future__ import annotations
+
+import threading
+import time
+
+import pytest
+
+from fbfh_trade import api
+
+
+class _FakeClock:
+    """取代 time.monotonic / time.sleep：sleep 只記錄秒數並推進時鐘。"""
+
+    def __init__(self, start: float = 100.0) -> None:
+        self.now = start
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = _FakeClock()
+    monkeypatch.setattr(time, "monotonic", fake.monotonic)
+    monkeypatch.setattr(time, "sleep", fake.sleep)
+    return fake
+
+
+def test_wait_turn_spaces_requests_by_rpm(clock):
+    state = api._ControlState(api.CONTROL_WINDOW_SEC)
+    state.set_rate(600)  # 每 0.1 秒一個時間點
+    for _ in range(4):
+        state.wait_turn()
+    assert clock.sleeps == pytest.approx([0.1, 0.1, 0.1])
+
+
+def test_wait_turn_staggers_simultaneous_callers(clock, monkeypatch):
+    """同一時刻預約的多個請求依序錯開（模擬多執行緒同時呼叫：時鐘不前進）。"""
+    state = api._ControlState(api.CONTROL_WINDOW_SEC)
+    state.set_rate(60)
+    monkeypatch.setattr(time, "sleep", clock.sleeps.append)  # 只記錄，不推進時鐘
+    for _ in range(3):
+        state.wait_turn()
+    assert clock.sleeps == pytest.approx([1.0, 2.0])
+
+
+def test_wait_turn_unlimited_and_cooldown(clock):
+    state = api._ControlState(api.CONTROL_WINDOW_SEC)
+    state.set_rate(0)
+    state.wait_turn()
+    state.wait_turn()
+    assert clock.sleeps == []
+    state.cool_down(5.0)
+    state.wait_turn()
+    assert clock.sleeps == pytest.approx([5.0])
+
+
+def test_wait_turn_aborts_when_stopped():
+    state = api._ControlState(api.CONTROL_WINDOW_SEC)
+    state.cool_down(3600.0)
+    stop = threading.Event()
+    stop.set()
+    with pytest.raises(InterruptedError):
+        state.wait_turn(stop)
+
+
+def test_counts_only_within_window(clock):
+    state = api._ControlState(10.0)
+    state.record(admitted=True)
+    state.record(admitted=False)
+    assert state.counts() == (1, 1)
+    clock.now += 11.0
+    state.record(admitted=True)
+    assert state.counts() == (1, 0)
+
+
+def _limit(limiter: api._AimdLimiter) -> int:
+    return int(limiter._limit)
+
+
+def test_aimd_decrease_halves_once_per_holdoff(clock):
+    limiter = api._AimdLimiter()
+    limiter.configure(1, 8)
+    assert _limit(limiter) == 8
+    limiter.on_congestion()
+    assert _limit(limiter) == 4
+    # 同一波擁塞（holdoff 內）不重複減半
+    clock.now += api._AimdLimiter.DECREASE_HOLDOFF_SEC / 2
+    limiter.on_congestion()
+    assert _limit(limiter) == 4
+    clock.now += api._AimdLimiter.DECREASE_HOLDOFF_SEC
+    limiter.on_congestion()
+    assert _limit(limiter) == 2
+    for _ in range(5):
+        clock.now += api._AimdLimiter.DECREASE_HOLDOFF_SEC
+        limiter.on_congestion()
+    assert _limit(limiter) == 1  # 不低於下限
+
+
+def test_aimd_additive_increase_up_to_hi(clock):
+    limiter = api._AimdLimiter()
+    limiter.configure(1, 4)
+    limiter.on_congestion()
+    assert _limit(limiter) == 2
+    # 每次成功 +ALPHA/limit（ALPHA=0.5）：由 2 起要 5 次成功才跨過 3
+    for _ in range(4):
+        limiter.on_success()
+    assert _limit(limiter) == 2
+    limiter.on_success()
+    assert _limit(limiter) == 3
+    for _ in range(100):
+        limiter.on_success()
+    assert limiter._limit == 4.0
+
+
+def test_aimd_acquire_blocks_at_limit():
+    limiter = api._AimdLimiter()
+    limiter.configure(1, 1)
+    limiter.acquire()
+    entered = threading.Event()
+
+    def second():
+        limiter.acquire()
+        entered.set()
+        limiter.release()
+
+    t = threading.Thread(target=second)
+    t.start()
+    assert not entered.wait(0.1)
+    limiter.release()
+    assert entered.wait(2)
+    t.join(2)
+
+
+def test_aimd_unconfigured_does_not_limit():
+    limiter = api._AimdLimiter()
+    for _ in range(50):
+        limiter.acquire()
+    limiter.on_congestion()
+    limiter.on_success()
+    assert limiter._limit is None
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""scripts/build_and_export.py：_slice_hits_after 由最後處理的 (統編, 年度) 之後接續。"""
+
+from __future__ import annotations
+
+import json
+
+import pytest
+
+pytest.importorskip("openpyxl")
+
+from conftest import load_script  # noqa: E402
+
+build_and_export = load_script("build_and_export")
+
+HITS = {
+    "11111111": {"113": {"a": 1}},
+    "22222222": {"112": {"b": 1}, "113": {"b": 2}, "114": {"b": 3}},
+    "33333333": {},
+    "44444444": {"113": {"d": 1}},
+}
+
+
+@pytest.fixture
+def hits_path(tmp_path):
+    path = tmp_path / "hits.json"
+    path.write_text(json.dumps(HITS), encoding="utf-8")
+    return path
+
+
+def test_slice_after_middle_year(hits_path):
+    sliced = build_and_export._slice_hits_after(hits_path, ("22222222", "113"))
+    assert sliced == {"22222222": {"114": {"b": 3}}, "44444444": {"113": {"d": 1}}}
+    assert list(sliced) == ["22222222", "44444444"]
+
+
+def test_slice_after_last_year_of_ban(hits_path):
+    assert build_and_export._slice_hits_after(hits_path, ("11111111", "113")) == {
+        "22222222": HITS["22222222"],
+        "44444444": HITS["44444444"],
+    }
+
+
+def test_slice_after_final_pair_is_empty(hits_path):
+    assert build_and_export._slice_hits_after(hits_path, ("44444444", "113")) == {}
+
+
+@pytest.mark.parametrize("last_pair", [None, ("99999999", "113"), ("22222222", "100")])
+def test_slice_from_start_when_unknown(hits_path, last_pair):
+    assert build_and_export._slice_hits_after(hits_path, last_pair) == HITS
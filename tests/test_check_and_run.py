@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""scripts/check_and_run.py：ijson 串流計數須與整檔載入後的 _pair_count 相同。"""
+
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from conftest import load_script
+
+check_and_run = load_script("check_and_run")
+
+SAMPLES = [
+    {},
+    {"12345675": {}},
+    {
+        "12345675": {"113": {"import_total": "A", "nested": {"a": 1, "b": [1, {"c": 2}]}}, "112": {}},
+        "04595257": {"113": {"details": {"company_name_zh": "甲", "telephone_2": None}}},
+        "00000000": "非 dict 的值不計",
+        "99999990": [{"113": {}}],
+    },
+]
+
+
+@pytest.mark.parametrize("data", SAMPLES)
+def test_stream_pair_count_matches_full_load(tmp_path, data):
+    if check_and_run.ijson is None:
+        pytest.skip("ijson 未安裝")
+    path = tmp_path / "hits.json"
+    path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    with path.open(encoding="utf-8") as f:
+        expected = check_and_run._pair_count(json.load(f))
+    assert check_and_run._stream_pair_count(path) == expected
+
+
+def test_stream_pair_count_malformed_returns_zero(tmp_path):
+    if check_and_run.ijson is None:
+        pytest.skip("ijson 未安裝")
+    path = tmp_path / "hits.json"
+    path.write_bytes(b'{"12345675": {"113": ')
+    assert check_and_run._stream_pair_count(path) == 0
+
+
+def test_count_json_pairs_uses_cache_until_file_changes(tmp_path):
+    path = tmp_path / "company_details.json"
+    path.write_text(json.dumps({"12345675": {"113": {}}}), encoding="utf-8")
+    assert check_and_run._count_json_pairs(path) == 1
+    path.write_text(json.dumps({"12345675": {"113": {}, "112": {}}, "04595257": {"113": {}}}), encoding="utf-8")
+    assert check_and_run._count_json_pairs(path) == 3
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""fbfh_trade.company.exporter：輸出的工作表列依 HEADERS 順序對應輸入，欄寬依內容估算。"""
+
+from __future__ import annotations
+
+import pytest
+
+openpyxl = pytest.importorskip("openpyxl")
+
+from openpyxl.utils import get_column_letter  # noqa: E402
+
+from fbfh_trade.company import exporter  # noqa: E402
+from fbfh_trade.company.exporter import HEADERS, MAX_COL_WIDTH, write_excel  # noqa: E402
+
+DATA = {
+    "12345675": {
+        "113": {
+            "rating_year": "113",
+            "import_total_code": "A",
+            "export_total_code": "B",
+            "details": {
+                "company_name_zh": "甲公司",
+                "company_name_en": "Jia Co.",
+                "telephone_1": "02-1234",
+                "telephone_2": "02-5678",
+                "representative": "王\x07小明",  # 控制字元須移除
+                "business_address_zh": "台北市" * 40,  # 超長：欄寬封頂
+                "website": "https://example.com",
+                "items_for_import": ["a", "b"],
+            },
+        },
+        "112": {"rating_year": "112", "details": None},
+    },
+    "04595257": "非 dict 的值仍產出一列",
+}
+
+
+def _read_rows(path):
+    wb = openpyxl.load_workbook(path)
+    ws = wb.active
+    rows = [list(r) for r in ws.iter_rows(values_only=True)]
+    return ws, rows
+
+
+def _expected_row(values):
+    # openpyxl 讀回時空字串為 None
+    return [v if v != "" else None for v in values]
+
+
+def test_sheet_rows_follow_headers(tmp_path):
+    out = tmp_path / "company_details.xlsx"
+    total, failed = write_excel(lambda: exporter._flatten_records(DATA.items()), out)
+    assert (total, failed) == (3, 0)
+
+    ws, rows = _read_rows(out)
+    assert rows[0] == HEADERS
+    assert len(rows) == 4
+
+    first = dict(zip(HEADERS, rows[1]))
+    assert first["統一編號"] == "12345675"
+    assert first["公司名稱"] == "甲公司"
+    assert first["電話號碼"] == "02-1234 / 02-5678"
+    assert first["進口評級"] == "A"
+    assert first["出口評級"] == "B"
+    assert first["評等年度"] == "113"
+    assert first["代表人"] == "王小明"
+    assert first["進口項目"] == '["a", "b"]'
+
+    assert rows[2] == _expected_row(["12345675", "", "", "", "", "112"] + [""] * (len(HEADERS) - 6))
+    assert rows[3] == _expected_row(["04595257"] + [""] * (len(HEADERS) - 1))
+    assert ws.freeze_panes == "A2"
+    assert ws.auto_filter.ref == f"A1:{get_column_letter(len(HEADERS))}4"
+    assert not (tmp_path / "company_details.xlsx.tmp").exists()
+
+
+def test_column_widths(tmp_path):
+    out = tmp_path / "company_details.xlsx"
+    write_excel(lambda: exporter._flatten_records(DATA.items()), out)
+    ws, _ = _read_rows(out)
+    widths = {h: ws.column_dimensions[get_column_letter(i)].width for i, h in enumerate(HEADERS, start=1)}
+    assert widths["登記地址(中文)"] == MAX_COL_WIDTH
+    assert widths["統一編號"] == 10  # 下限
+    assert widths["網站"] == len("https://example.com") + 2
+
+
+def test_unsanitizable_row_is_skipped_and_counted(tmp_path):
+    class Broken:
+        def __str__(self):
+            raise RuntimeError("boom")
+
+    rows = [["12345675"] + [""] * (len(HEADERS) - 1), ["04595257", Broken()] + [""] * (len(HEADERS) - 2)]
+    out = tmp_path / "company_details.xlsx"
+    total, failed = write_excel(lambda: iter(rows), out)
+    assert (total, failed) == (2, 1)
+    _, got = _read_rows(out)
+    assert [r[0] for r in got[1:]] == ["12345675"]
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""persistence.append_journal / replay_journal：追加、重播、截斷行與重播冪等。"""
+
+from __future__ import annotations
+
+from fbfh_trade.persistence import append_journal, replay_journal
+
+
+def _write(path, records):
+    with path.open("ab") as fh:
+        for ban, year, payload in records:
+            append_journal(fh, ban, year, payload)
+
+
+def test_replay_merges_records_in_order(tmp_path):
+    path = tmp_path / "hits.jsonl"
+    _write(path, [
+        ("12345675", "113", {"import_total": "A"}),
+        ("12345675", "112", {"import_total": "B"}),
+        ("12345675", "113", {"import_total": "C"}),  # 後寫的覆蓋先寫的
+    ])
+    store = {}
+    assert replay_journal(store, path) == 3
+    assert store == {"12345675": {"113": {"import_total": "C"}, "112": {"import_total": "B"}}}
+
+
+def test_replay_skips_truncated_final_line(tmp_path):
+    path = tmp_path / "ok.jsonl"
+    _write(path, [("12345675", "113", {"name_zh": "甲"}), ("04595257", "113", {"name_zh": "乙"})])
+    # 模擬寫到一半被中斷：最後一行不完整且沒有換行
+    with path.open("ab") as fh:
+        fh.write(b'{"ban":"04595240","year":"113","payl')
+
+    store = {}
+    assert replay_journal(store, path) == 2
+    assert set(store) == {"12345675", "04595257"}
+
+
+def test_replay_is_idempotent(tmp_path):
+    path = tmp_path / "hits.jsonl"
+    _write(path, [("12345675", "113", {"import_total": "A"})])
+    with path.open("ab") as fh:
+        fh.write(b'{"ban":')
+
+    store = {"00000000": {"113": {"import_total": "K"}}}
+    replay_journal(store, path)
+    once = {ban: dict(years) for ban, years in store.items()}
+    replay_journal(store, path)
+    assert store == once
+
+
+def test_replay_missing_journal(tmp_path):
+    store = {"12345675": {}}
+    assert replay_journal(store, tmp_path / "absent.jsonl") == 0
+    assert store == {"12345675": {}}
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+scripts/runner.py：依序取結果、checkpoint 水位線與中斷時的停機行為。
+API 呼叫以 stub 取代，不連網。
+"""
+
+from __future__ import annotations
+
+import itertools
+import os
+import random
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from fbfh_trade import jsonutil
+from fbfh_trade.http import sleep_unless_stopped
+from fbfh_trade.vat import uniform_number_stream
+
+START = "00000000"
+VATS = list(itertools.islice(uniform_number_stream(START), 12))
+
+
+def _response(vat, grade="Z"):
+    """API 成功回應：retrieveDataList 一列，index 6 為年度。"""
+    return {"result": "success", "retrieveDataList": [[vat, "", "公司" + vat, "Co", grade, "Z", "113"]]}
+
+
+def _drain_details(items_q, details, stop):
+    """取代背景補抓執行緒：只收佇列，不呼叫 builder。"""
+    while items_q.get() is not None:
+        pass
+
+
+def _run_main(runner, monkeypatch, post, *extra):
+    monkeypatch.setattr(sys, "argv", [
+        "runner.py", "--year", "113", "--start", START, "--concurrency", "3",
+        "--checkpoint-every", "1000", "--progress-every", "1000", *extra,
+    ])
+    monkeypatch.setattr(runner, "post_company_with_429_retry", post)
+    monkeypatch.setattr(runner, "_details_worker", _drain_details)
+    runner.main()
+
+
+def test_ordered_results_under_out_of_order_completion(runner):
+    inflight = []
+    peak = [0]
+    lock = threading.Lock()
+
+    def work(vat):
+        with lock:
+            inflight.append(vat)
+            peak[0] = max(peak[0], len(inflight))
+        time.sleep(random.uniform(0, 0.02))
+        with lock:
+            inflight.remove(vat)
+        return vat
+
+    random.seed(1)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        seen = [
+            (vat, future.result())
+            for vat, future in runner._ordered_results(VATS, lambda v: pool.submit(work, v), 4, 0)
+        ]
+    assert [vat for vat, _ in seen] == VATS
+    assert all(vat == result for vat, result in seen)
+    assert peak[0] <= 4
+
+
+def test_ordered_results_window_limits_submissions(runner):
+    submitted = []
+
+    def submit(vat):
+        submitted.append(vat)
+        return vat
+
+    gen = runner._ordered_results(VATS, submit, 3, 0)
+    first = next(gen)
+    assert first == (VATS[0], VATS[0])
+    assert submitted == VATS[:3]
+
+
+def test_checkpoint_after_interrupt(runner, monkeypatch, tmp_path):
+    stop_at = VATS[6]
+
+    def post(ban_no, **kwargs):
+        # 亂序完成；stop_at 模擬主執行緒等待該筆結果時收到 Ctrl+C
+        time.sleep(random.uniform(0, 0.02))
+        if ban_no == stop_at:
+            raise KeyboardInterrupt
+        return _response(ban_no, grade="A" if ban_no == VATS[2] else "Z")
+
+    random.seed(2)
+    _run_main(runner, monkeypatch, post)
+
+    # 水位線停在中斷前最後一筆依序處理完成的統編
+    state = jsonutil.load_path(tmp_path / "state.json")
+    assert state == {"next_number": int(VATS[5]) + 1}
+    ok_map = jsonutil.load_path(tmp_path / "ok.json")
+    assert list(ok_map) == VATS[:6]
+    hits = jsonutil.load_path(tmp_path / "hits.json")
+    assert list(hits) == [VATS[2]]
+    assert hits[VATS[2]]["113"]["import_total"] == "A"
+    # checkpoint 後日誌已清空
+    assert (tmp_path / "hits.jsonl").stat().st_size == 0
+    assert (tmp_path / "ok.jsonl").stat().st_size == 0
+
+
+def test_interrupt_does_not_wait_for_stalled_retry(runner, monkeypatch, tmp_path):
+    if not hasattr(signal, "SIGTERM") or sys.platform == "win32":
+        pytest.skip("需要 POSIX 訊號")
+    stalled = VATS[3]
+
+    def post(ban_no, stop=None, **kwargs):
+        if ban_no >= stalled:
+            # 模擬 --max-429-retries -1 時持續 429 的退避等待
+            sleep_unless_stopped(3600, stop)
+        return _response(ban_no)
+
+    previous = signal.getsignal(signal.SIGTERM)
+    timer = threading.Timer(0.3, os.kill, (os.getpid(), signal.SIGTERM))
+    timer.start()
+    t0 = time.monotonic()
+    try:
+        _run_main(runner, monkeypatch, post)
+    finally:
+        timer.cancel()
+        signal.signal(signal.SIGTERM, previous)
+
+    assert time.monotonic() - t0 < 10
+    state = jsonutil.load_path(tmp_path / "state.json")
+    assert state == {"next_number": int(VATS[2]) + 1}
+    assert list(jsonutil.load_path(tmp_path / "ok.json")) == VATS[:3]
+
+
+def test_details_worker_compacts_only_after_new_rows(runner, monkeypatch):
+    import queue
+
+    from fbfh_trade.company import builder, exporter
+
+    calls = []
+
+    def append_one(details, ban_no, year, meta, output_path, stop):
+        details.setdefault(ban_no, {})[year] = meta
+        calls.append(("append", ban_no))
+        return True
+
+    monkeypatch.setattr(builder, "append_one", append_one)
+    monkeypatch.setattr(builder, "save_output", lambda details, path: calls.append(("save", len(details))))
+    monkeypatch.setattr(exporter, "main", lambda: calls.append(("export",)))
+
+    items_q = queue.Queue()
+    details = {VATS[0]: {"113": {}}}
+    for item in (
+        (VATS[0], "113", {}),  # 已存在：不補抓、不觸發寫回
+        runner._COMPACT,
+        (VATS[1], "113", {}),
+        runner._COMPACT,
+        runner._COMPACT,  # 之後沒有新資料：不重寫
+        None,
+    ):
+        items_q.put(item)
+    runner._details_worker(items_q, details, threading.Event())
+
+    assert calls == [("append", VATS[1]), ("save", 2), ("export",)]
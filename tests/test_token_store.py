@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""fbfh_trade.company.token_store：單一取得（single flight）、失敗後可重試、自建 Session 會關閉。"""
+
+from __future__ import annotations
+
+import threading
+import time
+
+import pytest
+
+from fbfh_trade.company import token_store
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(token_store, "_token_cache", {"value": None, "exp": 0.0})
+    monkeypatch.setattr(token_store, "_fetching", False)
+
+
+def test_concurrent_callers_share_one_fetch(monkeypatch):
+    fetches = []
+    release = threading.Event()
+
+    def fetch(session, save_to, timeout):
+        fetches.append(session)
+        release.wait(2)
+        return "tok-1"
+
+    monkeypatch.setattr(token_store.vsc, "get_verify_s_hidden", fetch)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(token_store.get_token())) for _ in range(5)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    release.set()
+    for t in threads:
+        t.join(2)
+    assert results == ["tok-1"] * 5
+    assert len(fetches) == 1
+
+
+def test_cached_value_returned_while_fetch_in_progress(monkeypatch):
+    """快取仍有效時直接回傳，不等待其他呼叫端進行中的取得。"""
+    token_store._token_cache.update(value="tok-0", exp=time.time() + 60)
+    monkeypatch.setattr(token_store, "_fetching", True)  # 模擬另一執行緒正在取得
+    assert token_store.get_token() == "tok-0"
+
+
+def test_failure_releases_waiters_and_next_call_retries(monkeypatch):
+    calls = []
+
+    def fetch(session, save_to, timeout):
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("network down")
+        return "tok-2"
+
+    monkeypatch.setattr(token_store.vsc, "get_verify_s_hidden", fetch)
+    with pytest.raises(RuntimeError):
+        token_store.get_token()
+    assert token_store.get_token() == "tok-2"
+    assert len(calls) == 2
+
+
+def test_own_session_is_closed(monkeypatch):
+    sessions = []
+
+    class FakeSession:
+        closed = False
+
+        def __enter__(self):
+            sessions.append(self)
+            return self
+
+        def __exit__(self, *exc):
+            self.closed = True
+
+    monkeypatch.setattr(token_store.requests, "Session", FakeSession)
+    monkeypatch.setattr(token_store.vsc, "get_verify_s_hidden", lambda session, save_to, timeout: "tok-3")
+    assert token_store.get_token() == "tok-3"
+    assert len(sessions) == 1 and sessions[0].closed
+
+
+def test_invalidate_only_matching_value():
+    token_store._token_cache.update(value="tok-4", exp=time.time() + 60)
+    token_store.invalidate("other")
+    assert token_store.get_token() == "tok-4"
+    token_store.invalidate("tok-4")
+    assert token_store._token_cache["exp"] == 0.0
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""fbfh_trade.vat：numpy 批次版與純 Python 整數版的合法統編序列必須一致。"""
+
+from __future__ import annotations
+
+import itertools
+
+import pytest
+
+from fbfh_trade import vat
+from fbfh_trade.vat import explain_uniform_number, uniform_number_stream
+
+# 起點涵蓋開頭、第七位為 7 的區段與結尾（跨 STREAM_CHUNK 邊界另測）
+STARTS = ["00000000", "04595250", "12345670", "99990000"]
+COUNT = 2000
+
+
+def _reference_valid(number: str) -> bool:
+    """依規則直接由 explain_uniform_number 判斷（不經 _is_valid_int）。"""
+    _, _, z = explain_uniform_number(number)
+    return z % 5 == 0 or (number[6] == "7" and (z + 1) % 5 == 0)
+
+
+def _pure_stream(monkeypatch, start: str, count: int):
+    monkeypatch.setattr(vat, "np", None)
+    return list(itertools.islice(uniform_number_stream(start), count))
+
+
+@pytest.mark.parametrize("start", STARTS)
+def test_pure_python_stream_matches_rule(monkeypatch, start):
+    got = _pure_stream(monkeypatch, start, COUNT)
+    lo, hi = int(got[0]), int(got[-1])
+    expected = [f"{n:08d}" for n in range(int(start), hi + 1) if _reference_valid(f"{n:08d}")]
+    assert got == expected
+    assert lo >= int(start)
+
+
+@pytest.mark.parametrize("start", STARTS)
+def test_numpy_stream_matches_pure_python(monkeypatch, start):
+    if vat.np is None:
+        pytest.skip("numpy 未安裝")
+    fast = list(itertools.islice(uniform_number_stream(start), COUNT))
+    assert fast == _pure_stream(monkeypatch, start, COUNT)
+
+
+def test_numpy_stream_across_chunk_boundary(monkeypatch):
+    if vat.np is None:
+        pytest.skip("numpy 未安裝")
+    monkeypatch.setattr(vat, "STREAM_CHUNK", 97)  # 小批次，強迫跨越多個批次邊界
+    fast = list(itertools.islice(uniform_number_stream("00000700"), COUNT))
+    assert fast == _pure_stream(monkeypatch, "00000700", COUNT)
+
+
+def test_seventh_digit_seven_rule_is_exercised(monkeypatch):
+    """第七位為 7 時 (Z+1) % 5 == 0 也合法：這類號碼須出現在兩種版本的輸出中。"""
+    special = [
+        f"{n:08d}" for n in range(12345670, 12345680)
+        if explain_uniform_number(f"{n:08d}")[2] % 5 != 0 and _reference_valid(f"{n:08d}")
+    ]
+    assert special, "測試區段應包含只靠第七位 7 規則成立的號碼"
+    pure = _pure_stream(monkeypatch, "12345670", 10)
+    assert set(special) <= set(pure)
+    if vat.np is not None:
+        monkeypatch.undo()
+        fast = list(itertools.islice(uniform_number_stream("12345670"), 10))
+        assert fast == pure
+
+
+def test_stream_stops_at_last_number(monkeypatch):
+    assert list(uniform_number_stream("99999990")) == _pure_stream(monkeypatch, "99999990", 100)